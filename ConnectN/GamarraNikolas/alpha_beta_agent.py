@@ -1,6 +1,8 @@
 import math
-from typing import List, Tuple
+from typing import Iterable, List, Tuple
 
+import cache
+import stats
 from agent import Agent
 from board import Board
 from . import heuristic
@@ -22,10 +24,23 @@ class AlphaBetaAgent(Agent):
     #
     # PARAM [string] name:      the name of this player
     # PARAM [int]    max_depth: the maximum search depth
-    def __init__(self, name, max_depth):
+    # PARAM [bool]   lazy:      if True, build and score tree nodes only when alpha_beta
+    #                           reaches them instead of building the whole tree first
+    # PARAM [int]    cache_size: the number of move scores kept from one move to the
+    #                            next; 0 disables the cache
+    def __init__(self, name, max_depth, lazy=True, cache_size=1 << 15):
         super().__init__(name)
         # Max search depth
         self.max_depth = max_depth
+        # Expand the tree on demand
+        self.lazy = lazy
+        # Player the tree is scored for
+        self.root_player = 0
+        # Move scores by position, column and root player, and the geometry they are for
+        self.scores = cache.LRUCache(cache_size) if cache_size else None
+        self.geometry = None
+        # Search statistics of the last move
+        self.stats = stats.SearchStats()
 
     # Pick a column.
     #
@@ -33,16 +48,32 @@ class AlphaBetaAgent(Agent):
     # RETURN [int]: the column where the token must be added
     #
     # NOTE: make sure the column is legal, or you'll lose the game.
+    @stats.measured
     def go(self, brd):  # main routine invoked by game simulator
         """Search for the best move (choice of column for the token)"""
         # Your code here
 
+        # play wins and forced blocks without building a tree
+        forced = brd.forced_move()
+        if forced != -1:
+            return forced
+
         # create heuristic at specified depth for the current board
         player = brd.player  # get our player number
-        top_node = heuristic.Heuristic((brd, -1), player)  # create top node of tree
-        hu = self.create_heuristic(top_node, self.max_depth, player)  # recursively build tree
+        self.root_player = player
+        # position keys are only comparable on boards of the same geometry
+        if self.scores is not None and self.geometry != (brd.w, brd.h, brd.n):
+            self.scores.clear()
+        self.geometry = (brd.w, brd.h, brd.n)
+        # the whole tree is searched on one copy of the board with make/unmake
+        top_node = heuristic.Heuristic((brd.copy(), -1), player, cache=self.scores)  # create top node of tree
+        if self.lazy:
+            hu = top_node  # alpha_beta grows the tree as it goes
+        else:
+            hu = self.create_heuristic(top_node, self.max_depth, player)  # recursively build tree
 
         (score, path) = self.alpha_beta(hu, self.max_depth, -math.inf, math.inf, True)  # run alpha beta on huristic
+        self.stats.depth = self.max_depth
 
 
         if(debug_level>=2):
@@ -71,17 +102,20 @@ class AlphaBetaAgent(Agent):
         
         '''
 
+        self.stats.nodes += 1
         # If we've reached end of exploration, returns this nodes individual score and just the move made to get here
-        if depth == 0 or (not node.has_children()):
+        if depth == 0 or (not self.can_expand(node)):
             return node.score, [node.col]  # return tuple of score and path array
 
         # Whether we are doing minimizing or maximizing of score
         if maximizing_player:
             value = -math.inf
             value_path = []
-            for child in node.children:
-                # Recursively call
+            for i, child in enumerate(self.children(node)):
+                # Recursively call with the child's move made on the shared board
+                node.board.add_token(child.col)
                 child_score, child_path = self.alpha_beta(child, depth - 1, a, b, False)
+                node.board.undo_token()
 
                 # If we find a better score, save its path as the current best
                 if child_score > value:
@@ -93,6 +127,7 @@ class AlphaBetaAgent(Agent):
 
                 # Do alpha beta pruning
                 if a >= b:
+                    self.stats.cutoff(i)
                     break  # beta cutoff - return early
                 # if abs(child.calc_move_score(child.board,child.col))>threshold*(depth-depth+1):
                 #     print("THING")
@@ -102,9 +137,11 @@ class AlphaBetaAgent(Agent):
         else:
             value = math.inf
             value_path = []
-            for child in node.children:
-                # Recursively call
+            for i, child in enumerate(self.children(node)):
+                # Recursively call with the child's move made on the shared board
+                node.board.add_token(child.col)
                 child_score, child_path = self.alpha_beta(child, depth - 1, a, b, True)
+                node.board.undo_token()
 
                 # If we find a better (IE worse) score, save its path as the current best
                 if child_score < value:
@@ -116,6 +153,7 @@ class AlphaBetaAgent(Agent):
 
                 # Do alpha beta cut off
                 if a >= b:
+                    self.stats.cutoff(i)
                     break  # Alpha cutoff - return early
                 # if abs(child.calc_move_score(child.board,child.col))>threshold*(depth-depth+1):
                 #     print("THING")
@@ -123,17 +161,44 @@ class AlphaBetaAgent(Agent):
 
             return value, [node.col] + value_path
 
+    def can_expand(self, node: heuristic.Heuristic) -> bool:
+        """returns True if node has children, or could have if the tree is grown lazily"""
+        if self.lazy:
+            return bool(node.board.free_cols())
+        return node.has_children()
+
+    def children(self, node: heuristic.Heuristic) -> Iterable[heuristic.Heuristic]:
+        """returns the children of node; when lazy, each one is only built and scored when reached"""
+        if not self.lazy or node.has_children():
+            return node.children
+        return self.grow_children(node)
+
+    def grow_children(self, node: heuristic.Heuristic) -> Iterable[heuristic.Heuristic]:
+        """yields the children of node one by one, adding each to the tree as it is built"""
+        brd = node.board
+        for col in brd.free_cols():
+            # score the move on the shared board, then take it back before yielding
+            brd.add_token(col)
+            child = heuristic.Heuristic((brd, col), self.root_player, node.score, self.scores)
+            brd.undo_token()
+            self.stats.evals += 1  # each node scores its move when created
+            node.add_child(child)
+            yield child
+
     def create_heuristic(self, node: heuristic.Heuristic, depth: int, root: int) -> heuristic.Heuristic:
         """recursively builds tree to specified depth"""
         if depth > 0:
             # If we're calling this we want to force (re)generation
             node.children = []
-            successors = self.get_successors(node.board)
-            for board_and_col in successors:
-                # Make a new heuristic containing the new board, the col dropped to form it, and the player1
-                child = heuristic.Heuristic(board_and_col, root, node.score)
+            brd = node.board
+            for col in brd.free_cols():
+                # Make the move on the shared board, score it and build the subtree, then take it back
+                brd.add_token(col)
+                child = heuristic.Heuristic((brd, col), root, node.score, self.scores)
+                self.stats.evals += 1  # each node scores its move when created
                 node.add_child(child)  # , root)
                 self.create_heuristic(child, depth - 1, root)
+                brd.undo_token()
 
         # Regardless, return the node
         return node  # if depth zero is reached return the tree that was input
@@ -5,7 +5,8 @@ from __future__ import annotations
 
 from typing import Tuple, Optional
 
-from board import Board
+from board import Board, ray_table
+from cache import LRUCache
 import math
 from LessardPhilippe.alpha_beta_agent import AlphaBetaAgent as ph
 
@@ -13,12 +14,17 @@ debug_level = 0
 
 
 class Heuristic:
-    def __init__(self, data: Tuple[Board, int], root_player: int, parent_score: int = 0):
-        self.board = data[0]  # holds 2d array of board
+    # Nodes only hold a reference to the board the whole tree is searched on,
+    # which is in this node's position while it is being scored or searched
+    __slots__ = ('board', 'col', 'children', 'root_player', 'score')
+
+    def __init__(self, data: Tuple[Board, int], root_player: int, parent_score: int = 0,
+                 cache: Optional[LRUCache] = None):
+        self.board = data[0]  # holds board, shared with the rest of the tree
         self.col = data[1]  # holds column where last move was made
         self.children = []  # holds object of this class in tree data structure
         self.root_player = root_player  # keeps record of root player so heuristic can be informed by it
-        self.score = parent_score + self.calc_move_score(self.board, self.col)  # calculates heuristic for node
+        self.score = parent_score + self.cached_move_score(cache)  # calculates heuristic for node
 
     def add_child(self, obj: Heuristic):
         """adds a child to tree"""
@@ -32,6 +38,18 @@ class Heuristic:
         else:
             return 1
 
+    def cached_move_score(self, cache: Optional[LRUCache]) -> int:
+        """calculates heuristic, or looks it up in cache if one is given"""
+        if cache is None:
+            return self.calc_move_score(self.board, self.col)
+        # the score only depends on the position, the column and the root player
+        key = (self.board.key, self.board.player, self.col, self.root_player)
+        score = cache.get(key)
+        if score is None:
+            score = self.calc_move_score(self.board, self.col)
+            cache.put(key, score)
+        return score
+
     def calc_move_score(self, board: Board, col: int) -> int:
         """calculates heuristic"""
         score = 0
@@ -93,18 +111,12 @@ class Heuristic:
 
     def get_depth(self, x) -> Optional[int]:
         """gets y val of dropped piec in col x. Returns None if no pieces"""
-        y = 0
-
-        # Search for first gap
-        while self.is_bounded(x, y) and self.board.board[y][x] != 0:
-            y += 1
-
-        if y == 0:
+        if not self.is_bounded(x, 0) or self.board.heights[x] == 0:
             # No tiles found
             return None
         else:
-            # Return index below first gap found
-            return y - 1
+            # The board tracks how many tokens each column holds
+            return self.board.heights[x] - 1
 
     def block_nless1(self, x, y):
         char = self.get_cell(x, y)
@@ -156,13 +168,21 @@ class Heuristic:
         return total + 1
 
     def density(self, x, y, size):
+        """counts the cells in [x-size, x+size) x [y-size, y+size) holding the token at (x,y)"""
         points = 0
         if (self.is_bounded(x, y)):
-            for i in range(x - size, x + size):
-                for j in range(y - size, y + size):
-                    if self.is_bounded(i, j):
-                        if self.get_cell(i, j) == self.get_cell(x, y):
-                            points += 1
+            brd = self.board
+            char = brd.board[y][x]
+            # clip the box to the board, then count from the board's integral images
+            x0 = max(x - size, 0)
+            y0 = max(y - size, 0)
+            x1 = min(x + size, brd.w)
+            y1 = min(y + size, brd.h)
+            if char == 0:
+                points = (x1 - x0) * (y1 - y0) - brd.count_tokens(1, x0, y0, x1, y1) \
+                         - brd.count_tokens(2, x0, y0, x1, y1)
+            else:
+                points = brd.count_tokens(char, x0, y0, x1, y1)
         return points
 
     def wining_move(self, x, y):
@@ -222,7 +242,16 @@ class Heuristic:
         length = 0
 
         # Get the starting char
-        char = self.board.board[y][x]
+        rows = self.board.board
+        char = rows[y][x]
+
+        # From a cell on the board, follow the precomputed ray
+        if self.is_bounded(x, y):
+            for (i, j) in ray_table(self.board.w, self.board.h, dx, dy)[y][x]:
+                if rows[j][i] != char:
+                    break
+                length += 1
+            return length
 
         # Take the first step
         x += dx
@@ -230,7 +259,7 @@ class Heuristic:
 
         # Loop until out of bound or we break
         while self.is_bounded(x, y):
-            if self.board.board[y][x] == char:
+            if rows[y][x] == char:
                 length += 1
             else:
                 break
@@ -241,11 +270,12 @@ class Heuristic:
         return length
 
     def is_bounded(self, x, y):
-        return x >= 0 and x < self.board.w and y >= 0 and y < self.board.h
+        return 0 <= x < self.board.w and 0 <= y < self.board.h
 
     def get_cell(self, x, y) -> Optional[int]:
-        if self.is_bounded(x, y):
-            return self.board.board[y][x]
+        brd = self.board
+        if 0 <= x < brd.w and 0 <= y < brd.h:
+            return brd.board[y][x]
 
     def has_children(self):  # helper function to check if at bottom of tree
         if len(self.children) > 0:
@@ -1,5 +1,10 @@
 import math
+import time
 import agent
+import ordering
+import search
+import solver
+import stats
 
 ###########################
 # Alpha-Beta Search Agent #
@@ -12,11 +17,42 @@ class AlphaBetaAgent(agent.Agent):
     #
     # PARAM [string] name:      the name of this player
     # PARAM [int]    max_depth: the maximum search depth
-    def __init__(self, name, max_depth):
+    # PARAM [float]  time_limit: if given, search by iterative deepening for this
+    #                            many seconds instead of running minimax
+    # PARAM [int]    solve_below: if given, solve positions with at most this many
+    #                             empty cells exactly instead of searching them
+    # PARAM [book.OpeningBook] book: if given, play its moves in the positions it holds
+    # PARAM [float]  solve_time: without time_limit, the seconds the solver gets before
+    #                            falling back to minimax; by default half of a 15 second move
+    # PARAM [bool]   pvs:        if True, the iterative deepening search uses principal
+    #                            variation search
+    # PARAM [float]  aspiration: half-width of the aspiration windows of the iterative
+    #                            deepening search, or None for full windows
+    def __init__(self, name, max_depth, time_limit=None, solve_below=None, book=None, solve_time=7.5,
+                 pvs=True, aspiration=None):
         super().__init__(name)
+        # Opening book, or None
+        self.book = book
         # Max search depth
         self.max_depth = max_depth
         self.has_not_moved = True
+        # Endgame solver, or None
+        self.solver = None
+        if solve_below is not None:
+            self.solver = solver.Solver(solve_below)
+        # Time budget of the solver when there is no search engine
+        self.solve_time = solve_time
+        # Anytime search engine, or None to use minimax
+        self.searcher = None
+        if time_limit is not None:
+            self.searcher = search.Searcher(self.evaluate, time_limit, win=10**10,
+                                            orderer=ordering.MoveOrderer(), pvs=pvs, aspiration=aspiration,
+                                            solver=self.solver)
+        # Search statistics of the last move
+        if self.searcher is not None:
+            self.stats = self.searcher.stats
+        else:
+            self.stats = stats.SearchStats()
 
     # Pick a column.
     #
@@ -24,6 +60,7 @@ class AlphaBetaAgent(agent.Agent):
     # RETURN [int]: the column where the token must be added
     #
     # NOTE: make sure the column is legal, or you'll lose the game.
+    @stats.measured
     def go(self, brd):
         """Search for the best move (choice of column for the token)"""
         # Your code here
@@ -32,10 +69,30 @@ class AlphaBetaAgent(agent.Agent):
             self.opp = 1
         else:
             self.opp = 2
+        if self.book is not None:
+            move = self.book.lookup(brd)
+            if move != -1:
+                self.has_not_moved = False
+                return move
+        if self.searcher is not None:
+            return self.searcher.search(brd)
+        # Wins and forced blocks need no search
+        forced = brd.forced_move()
+        if forced != -1:
+            self.has_not_moved = False
+            return forced
+        if self.solver is not None and self.solver.applies(brd):
+            try:
+                move = self.solver.solve(brd, time.time() + self.solve_time)[1]
+                self.has_not_moved = False
+                return move
+            except search.SearchTimeout:
+                pass  # Too big to solve in time, search it instead
         if self.player == 1 and self.has_not_moved is True:
             return math.floor(brd.w/2)
         self.has_not_moved = False
         best_value = self.minimax(brd, 3, 1, True, -math.inf, math.inf)
+        self.stats.depth = self.max_depth - 1
         col_is = self.col
         for successor, col in self.get_successors(brd):
             if col == self.col:
@@ -59,18 +116,20 @@ class AlphaBetaAgent(agent.Agent):
         player1_streak = 0
         player2_streak = 0
 
+        rows = brd.board
+
         #checks a cell to see if there is a piece there
         for i in range(max(brd.h, brd.w)):
                 x_index = x + (dx * (i+1))
                 y_index = y + (dy * (i+1))
 
                 if (-1 < x_index < brd.h) and (-1 < y_index < brd.w):
-                    if brd.board[x_index][y_index] != 0:
+                    if rows[x_index][y_index] != 0:
 
                         if ((x_index == 0 or x_index == brd.h) and dx != 0) or ((y_index == 0 or y_index == brd.w) and dy != 0):
                             blocked_one_side_edge = True
 
-                        if brd.board[x_index][y_index] == 1:
+                        if rows[x_index][y_index] == 1:
 
                             if player2_streak:
                                 if not blocked_one_side_edge or disjoint:
@@ -85,7 +144,7 @@ class AlphaBetaAgent(agent.Agent):
 
                             player1_streak += 1
 
-                        if brd.board[x_index][y_index] == 2:
+                        if rows[x_index][y_index] == 2:
 
                             if player1_streak:
                                 if not blocked_one_side_edge or disjoint:
@@ -186,29 +245,46 @@ class AlphaBetaAgent(agent.Agent):
         return self.check_lines(brd)
 
 
+    def evaluate(self, brd, player):
+        """Scores brd for player, as a search.Searcher evaluation function"""
+        value = self.check_lines(brd)
+        if player == self.player:
+            return value
+        return -value
+
+
     def minimax(self, brd, column, depth, isMaximizingPlayer, alpha, beta):
+        self.stats.nodes += 1
         if self.max_depth == depth:
+            self.stats.evals += 1
             return self.evaluation(brd)
 
         if isMaximizingPlayer:
             best_value = -math.inf
-            for successor, col in self.get_successors(brd):
-                value = self.minimax(successor, col, depth+1, False, alpha, beta)
+            for i, col in enumerate(brd.free_cols()):
+                # search the successor in place, then take the token back
+                brd.add_token(col)
+                value = self.minimax(brd, col, depth+1, False, alpha, beta)
+                brd.undo_token()
                 best_value = max(best_value, value)
                 if best_value == value:
                     self.col = col
                 alpha = max(alpha, best_value)
                 if beta <= alpha:
+                    self.stats.cutoff(i)
                     break
             return best_value
 
         else:
             best_value = math.inf
-            for successor, col in self.get_successors(brd):
-                value = self.minimax(successor, col, depth+1, True, alpha, beta)
+            for i, col in enumerate(brd.free_cols()):
+                brd.add_token(col)
+                value = self.minimax(brd, col, depth+1, True, alpha, beta)
+                brd.undo_token()
                 best_value = min(best_value, value)
                 beta = min(beta, best_value)
                 if beta <= alpha:
+                    self.stats.cutoff(i)
                     break
             return best_value
 
@@ -1,6 +1,13 @@
 import math
+import time
 import agent
 import board
+import ordering
+import parallel
+import search
+import solver
+import stats
+import transposition
 
 ###########################
 # Alpha-Beta Search Agent #
@@ -13,12 +20,55 @@ class AlphaBetaAgent(agent.Agent):
     #
     # PARAM [string] name:      the name of this player
     # PARAM [int]    max_depth: the maximum search depth
-    def __init__(self, name, max_depth):
+    # PARAM [float]  time_limit (optional): if given, search by iterative deepening
+    #                                       for this many seconds instead of to max_depth
+    # PARAM [float]  tt_megabytes (optional): size of the transposition table used by the
+    #                                         iterative deepening search
+    # PARAM [int]    workers (optional): number of processes running the iterative deepening
+    #                                    search; above 1, they share the transposition table
+    # PARAM [int]    solve_below (optional): solve positions with at most this many empty
+    #                                        cells exactly instead of searching them
+    # PARAM [float]  solve_time (optional): without time_limit, the seconds the solver gets
+    #                                       before falling back to the fixed-depth search;
+    #                                       by default half of a 15 second move
+    # PARAM [bool]   pvs (optional): if True, the iterative deepening search uses principal
+    #                                variation search
+    # PARAM [float]  aspiration (optional): half-width of the aspiration windows of the
+    #                                       iterative deepening search, or None for full windows
+    # PARAM [book.OpeningBook] book (optional): opening book, consulted before searching
+    # PARAM [bool]   ponder (optional): if True, keep searching the expected next position
+    #                                   in a background process while the opponent thinks
+    def __init__(self, name, max_depth, time_limit=None, tt_megabytes=16, workers=1, solve_below=None,
+                 book=None, ponder=False, solve_time=7.5, pvs=True, aspiration=None):
         super().__init__(name)
+        # opening book, or None
+        self.book = book
         # Max search depth
         self.max_depth = max_depth
         # number of points for a winning board
         self.WIN = 1234560
+        # endgame solver, or None
+        self.solver = None
+        if solve_below is not None:
+            self.solver = solver.Solver(solve_below)
+        # time budget of the solver when there is no search engine
+        self.solve_time = solve_time
+        # anytime search engine, or None to use evalBoard
+        self.searcher = None
+        if time_limit is not None and (workers > 1 or ponder):
+            self.searcher = parallel.ParallelSearcher(self.evaluate, time_limit, workers, tt_megabytes,
+                                                      ponder=ponder, win=10 * self.WIN, pvs=pvs,
+                                                      aspiration=aspiration, solver=self.solver)
+        elif time_limit is not None:
+            tt = transposition.TranspositionTable(tt_megabytes)
+            self.searcher = search.Searcher(self.evaluate, time_limit, win=10 * self.WIN, tt=tt,
+                                            orderer=ordering.MoveOrderer(), pvs=pvs, aspiration=aspiration,
+                                            solver=self.solver)
+        # search statistics of the last move, shared with the search engine if there is one
+        if self.searcher is not None:
+            self.stats = self.searcher.stats
+        else:
+            self.stats = stats.SearchStats()
 
     # Pick a column.
     #
@@ -26,11 +76,28 @@ class AlphaBetaAgent(agent.Agent):
     # RETURN [int]: the column where the token must be added
     #
     # NOTE: make sure the column is legal, or you'll lose the game.
+    @stats.measured
     def go(self, brd):
         """Search for the best move (choice of column for the token)"""
+        if self.book is not None:
+            move = self.book.lookup(brd)
+            if move != -1:
+                return move
+        if self.searcher is not None:
+            return self.searcher.search(brd)
+        # Wins and forced blocks need no search
+        move = brd.forced_move()
+        if move != -1:
+            return move
+        if self.solver is not None and self.solver.applies(brd):
+            try:
+                return self.solver.solve(brd, time.time() + self.solve_time)[1]
+            except search.SearchTimeout:
+                pass  # too big to solve in time, search it instead
         freecols = brd.free_cols()
 
         alpha, move = self.evalBoard(brd, -100000, 100000, self.max_depth, self.player, True)
+        self.stats.depth = self.max_depth
         #print(move)
         # come up with a better solution TODO
 #        if move not in freecols:
@@ -38,6 +105,12 @@ class AlphaBetaAgent(agent.Agent):
 
         return move
 
+    # Stop the background search processes, if any.
+    def close(self):
+        """Releases the helper processes of a parallel search engine"""
+        if isinstance(self.searcher, parallel.ParallelSearcher):
+            self.searcher.close()
+
     # Get the successors of the given board.
     #
     # PARAM [board.Board] brd: the board state
@@ -74,11 +147,10 @@ class AlphaBetaAgent(agent.Agent):
     # RETURN [int, int]: the alpha value of the board, the maximizing move to make
     def evalBoard(self, brd, alpha, beta, depth, player, firstCall = False):
         """Evaluates what move to make based on the current board, using the Negamax algorithm"""
+        self.stats.nodes += 1
         # if this board is a winning board, return a large number so that we will choose it
-        for y in range(brd.h):
-            for x in range(brd.w):
-                if self.is_any_line_at(x,y, brd, player):
-                    return self.WIN, -1
+        if brd.get_outcome() == player:
+            return self.WIN, -1
 
         # if we've reached max depth, just return the score
         # the higher levels will deal with all the pruning and minimaxing logic
@@ -87,31 +159,47 @@ class AlphaBetaAgent(agent.Agent):
         else:
             opponent = 1
         if depth == 0:
+            self.stats.evals += 1
             score = (self.scoreBoard(brd, player) - self.scoreBoard(brd, opponent))
             return score, -1
 
         if alpha >= beta:
             return beta, -1
 
-        succs = self.get_successors(brd)
+        # search the successors in place on brd, undoing each move afterwards
         bestMove = -1
-        for succ, move in succs:
+        for i, move in enumerate(brd.free_cols()):
             if bestMove == -1:
                 bestMove = move
 
+            brd.add_token(move)
             if firstCall:
-                score, next_move = self.evalBoard(succ, alpha, beta, depth - 1, player)
+                score, next_move = self.evalBoard(brd, alpha, beta, depth - 1, player)
             else:
-                score, next_move = self.evalBoard(succ, -1 * beta, -1 * alpha, depth - 1, opponent)
+                score, next_move = self.evalBoard(brd, -1 * beta, -1 * alpha, depth - 1, opponent)
                 score = -1 * score
-            
+            brd.undo_token()
+
             if score >= beta:
+                self.stats.cutoff(i)
                 return score, move
             if score > alpha:
                 alpha = score
                 bestMove = move
         return alpha, bestMove
 
+    # scores a board for a player, for use as a search.Searcher evaluation function
+    # PARAM [board.Board] brd: the board being scored
+    # PARAM [int] player: the player the score is for
+    # RETURN [int]: the player's score minus the opponent's score
+    def evaluate(self, brd, player):
+        """scores a board from the point of view of player"""
+        if player == 1:
+            opponent = 2
+        else:
+            opponent = 1
+        return self.scoreBoard(brd, player) - self.scoreBoard(brd, opponent)
+
     # gives a board a score according to my heuristics
     # PARAM [board.Board] brd: the board being scored
     # PARAM [int] player: the player to look for a line for
@@ -210,9 +298,12 @@ class AlphaBetaAgent(agent.Agent):
         numConsecutive = 0
         numConsecutiveOpp = 0
 
+        # row-major board data, looked up once for the whole line
+        rows = brd.board
+
         while (x < brd.w and y < brd.h and x >= 0 and y >= 0):
             # if piece belongs to me
-            if brd.board[y][x] == player:
+            if rows[y][x] == player:
                 # give me one point for owning the piece
                 points += 1
                 # if the last point checked was empty, I can expand in that direction, so give me a point
@@ -235,7 +326,7 @@ class AlphaBetaAgent(agent.Agent):
                 # set the number of consecutive opponent piece to 0 since this is mine
                 numConsecutiveOpp = 0
 
-            elif brd.board[y][x] == opponent:
+            elif rows[y][x] == opponent:
                 # if this piece blocks less than N of my own pieces in between opponents pieces and/or wall,
                 # those pieces cannot be part of N in a row in this direction, so they shoouldn't give me
                 # any points
@@ -264,7 +355,7 @@ class AlphaBetaAgent(agent.Agent):
                     return -1 * self.WIN
 
             # if there is no piece here
-            elif brd.board[y][x] == 0:
+            elif rows[y][x] == 0:
                 # the last point checked (this one) is clear
                 lastPointClear = True
                 # if a series of consecutive pieces belonging to me starts, it is unblocked on this side
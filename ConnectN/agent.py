@@ -23,6 +23,8 @@ class Agent(object):
         self.name = name
         # Uninitialized player - will be set upon starting a Game
         self.player = 0
+        # Search statistics of the last move (a stats.SearchStats), or None
+        self.stats = None
 
     # Pick a column.
     #
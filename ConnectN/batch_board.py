@@ -0,0 +1,179 @@
+import numpy as np
+
+import board
+
+###############
+# Batch Board #
+###############
+
+# Many boards of the same geometry, advanced in lockstep.
+#
+# The cells of all the boards are kept in one (N, h, w) int8 array, row-major
+# like board.Board, so cells[i, y, x] is the token at (x,y) in board i.
+class BatchBoard(object):
+
+    # Class constructor.
+    #
+    # PARAM [int] count: the number of boards
+    # PARAM [int] w:     the board width
+    # PARAM [int] h:     the board height
+    # PARAM [int] n:     the number of tokens to line up to win
+    def __init__(self, count, w, h, n):
+        """Class constructor"""
+        # Board data, one empty board per entry
+        self.cells = np.zeros((count, h, w), dtype=np.int8)
+        # Board width
+        self.w = w
+        # Board height
+        self.h = h
+        # How many tokens in a row to win
+        self.n = n
+        # Current player of each board
+        self.player = np.ones(count, dtype=np.int8)
+        # Number of tokens in each column of each board
+        self.heights = np.zeros((count, w), dtype=np.int32)
+        # Game outcome of each board: 1 for Player 1, 2 for Player 2, 0 for no winner
+        self.outcome = np.zeros(count, dtype=np.int8)
+
+    # Number of boards in the batch.
+    def __len__(self):
+        return self.cells.shape[0]
+
+    # Build a batch from a list of boards.
+    #
+    # PARAM [list of board.Board] boards: boards with the same geometry
+    # RETURN [batch_board.BatchBoard]: a batch holding a copy of each board
+    @classmethod
+    def from_boards(cls, boards):
+        """Returns a batch holding a copy of each of the given boards"""
+        b0 = boards[0]
+        batch = cls(len(boards), b0.w, b0.h, b0.n)
+        for i, brd in enumerate(boards):
+            batch.cells[i] = brd.board
+            batch.player[i] = brd.player
+            batch.outcome[i] = brd.get_outcome()
+        batch.heights[:] = (batch.cells != 0).sum(axis=1)
+        return batch
+
+    # Build a batch of identical boards.
+    #
+    # PARAM [board.Board] brd:   the board to replicate
+    # PARAM [int]         count: the number of copies
+    # RETURN [batch_board.BatchBoard]: a batch of count copies of brd
+    @classmethod
+    def from_board(cls, brd, count):
+        """Returns a batch holding count copies of the given board"""
+        batch = cls.from_boards([brd])
+        batch.cells = np.repeat(batch.cells, count, axis=0)
+        batch.player = np.repeat(batch.player, count)
+        batch.heights = np.repeat(batch.heights, count, axis=0)
+        batch.outcome = np.repeat(batch.outcome, count)
+        return batch
+
+    # Extract one board of the batch.
+    #
+    # PARAM [int] i: the index of the board
+    # RETURN [board.Board]: a copy of board i
+    def to_board(self, i):
+        """Returns a board.Board copy of board i"""
+        brd = board.Board(self.cells[i].tolist(), self.w, self.h, self.n)
+        brd.player = int(self.player[i])
+        return brd
+
+    # Returns the columns with at least one free slot, for each board.
+    #
+    # RETURN [(N, w) array of bool]: True where a token can be added
+    def legal_moves(self):
+        """Returns an (N, w) mask of the columns with at least one free slot"""
+        return self.heights < self.h
+
+    # Returns which boards are finished, either won or full.
+    #
+    # RETURN [(N,) array of bool]: True for finished boards
+    def done(self):
+        """Returns an (N,) mask of the boards whose game is over"""
+        return (self.outcome != 0) | ~self.legal_moves().any(axis=1)
+
+    # Adds a token for the current player of each board.
+    #
+    # PARAM [(N,) array of int] cols: the column for each board; the columns are
+    #                                 assumed not full. A negative column leaves
+    #                                 that board unchanged.
+    #
+    # NOTE: This method switches the current player of the boards that moved.
+    def add_token(self, cols):
+        """Adds a token for the current player of each board at the given columns"""
+        cols = np.asarray(cols)
+        idx = np.nonzero(cols >= 0)[0]
+        x = cols[idx]
+        y = self.heights[idx, x]
+        self.cells[idx, y, x] = self.player[idx]
+        self.heights[idx, x] += 1
+        # Only the players who just moved can have completed a line
+        playing = idx[self.outcome[idx] == 0]
+        won = self.lines(self.cells[playing] == self.player[playing, None, None])
+        self.outcome[playing[won]] = self.player[playing[won]]
+        # Switch player
+        self.player[idx] = 3 - self.player[idx]
+
+    # Check which boards contain n aligned tokens, using sliding-window sums.
+    #
+    # PARAM [(M, h, w) array of bool] tokens: the tokens of one player per board
+    # RETURN [(M,) array of bool]: True for the boards with a line of n tokens
+    def lines(self, tokens):
+        """Returns an (M,) mask of the boards where the given tokens line up n in a row"""
+        n = self.n
+        h = self.h
+        w = self.w
+        t = tokens.astype(np.int16)
+        found = np.zeros(t.shape[0], dtype=bool)
+        # Each window sum adds n shifted slices of the token array
+        if w >= n:
+            s = sum(t[:, :, i:w-n+1+i] for i in range(n))
+            found |= (s == n).any(axis=(1, 2))
+        if h >= n:
+            s = sum(t[:, i:h-n+1+i, :] for i in range(n))
+            found |= (s == n).any(axis=(1, 2))
+        if w >= n and h >= n:
+            # Diagonal up
+            s = sum(t[:, i:h-n+1+i, i:w-n+1+i] for i in range(n))
+            found |= (s == n).any(axis=(1, 2))
+            # Diagonal down
+            s = sum(t[:, n-1-i:h-i, i:w-n+1+i] for i in range(n))
+            found |= (s == n).any(axis=(1, 2))
+        return found
+
+    # Calculate the game outcome of each board from scratch.
+    #
+    # RETURN [(N,) array of int]: 1 for Player 1, 2 for Player 2, and 0 for no winner
+    def scan_outcome(self):
+        """Returns the winner of each board, computed from the cells"""
+        outcome = np.zeros(len(self), dtype=np.int8)
+        outcome[self.lines(self.cells == 2)] = 2
+        outcome[self.lines(self.cells == 1)] = 1
+        return outcome
+
+    # Pick a random free column for each unfinished board.
+    #
+    # PARAM [numpy.random.Generator] rng: the random number generator
+    # RETURN [(N,) array of int]: a random legal column, or -1 for finished boards
+    def random_moves(self, rng):
+        """Returns a uniformly random legal column per board, -1 where the game is over"""
+        legal = self.legal_moves()
+        # Random keys, with the illegal columns pushed below every legal one
+        keys = np.where(legal, rng.random(legal.shape), -1.0)
+        cols = keys.argmax(axis=1)
+        cols[self.done()] = -1
+        return cols
+
+    # Play random moves on every board until all the games are over.
+    #
+    # PARAM [numpy.random.Generator] rng: the random number generator
+    # RETURN [(N,) array of int]: the outcome of each game
+    def playout(self, rng):
+        """Plays every game to the end with random moves and returns the outcomes"""
+        while True:
+            cols = self.random_moves(rng)
+            if (cols < 0).all():
+                return self.outcome
+            self.add_token(cols)
@@ -0,0 +1,365 @@
+###################
+# Bitboard Board  #
+###################
+
+# Bitboard-backed drop-in replacement for board.Board.
+#
+# Each player's tokens are kept in a Python integer. Bits are laid out
+# column-major with one sentinel row on top of every column, so the cell
+# (x,y) is bit x*(h+1)+y. The sentinel bits are always zero, which keeps
+# vertical and diagonal runs from wrapping into the next column; since Python
+# integers are unbounded, any w, h and n work.
+
+from board import zobrist_table
+
+# Rectangle masks for count_tokens(), by (w, h, x0, y0, x1, y1)
+_RECT_MASKS = {}
+
+class BitBoard(object):
+
+    __slots__ = ('w', 'h', 'n', 'player', 'pos', 'mask', 'heights', 'last_move', 'outcome', 'history', '_grid',
+                 'zobrist', '_key', '_mirror_key')
+
+    # Class constructor.
+    #
+    # PARAM [2D list of int] board: the board configuration, row-major
+    # PARAM [int]            w:     the board width
+    # PARAM [int]            h:     the board height
+    # PARAM [int]            n:     the number of tokens to line up to win
+    def __init__(self, board, w, h, n):
+        """Class constructor"""
+        # Board width
+        self.w = w
+        # Board height
+        self.h = h
+        # How many tokens in a row to win
+        self.n = n
+        # Current player
+        self.player = 1
+        # Tokens of Player 1 and Player 2
+        self.pos = [0, 0]
+        for y in range(h):
+            for x in range(w):
+                if board[y][x] != 0:
+                    self.pos[board[y][x]-1] |= 1 << (x * (h+1) + y)
+        # Occupied cells
+        self.mask = self.pos[0] | self.pos[1]
+        # Number of tokens in each column
+        self.heights = [0] * w
+        for x in range(w):
+            while self.heights[x] < h and board[self.heights[x]][x] != 0:
+                self.heights[x] += 1
+        # Last token added, as (x,y), or None
+        self.last_move = None
+        # Cached game outcome, kept up to date by add_token()
+        self.outcome = 0
+        if self.is_win(self.pos[0]):
+            self.outcome = 1
+        elif self.is_win(self.pos[1]):
+            self.outcome = 2
+        # Moves made on this board, as (move bit, last move, outcome) before the move
+        self.history = []
+        # Row-major view, built on demand
+        self._grid = None
+        # Zobrist keys of the position and of its mirror image, the same as board.Board's
+        self.zobrist = zobrist_table(w, h)
+        self.rekey()
+
+    # Row-major view of the board, for code that reads board[y][x].
+    #
+    # RETURN [2D list of int]: the board configuration, row-major
+    #
+    # NOTE: the view is rebuilt lazily after the position changes; writing
+    #       to it does not modify the bitboards.
+    @property
+    def board(self):
+        """Row-major view of the board, for code that reads board[y][x]"""
+        if self._grid is None:
+            hh = self.h + 1
+            p1, p2 = self.pos
+            grid = [[0] * self.w for y in range(self.h)]
+            for x in range(self.w):
+                for y in range(self.h):
+                    bit = 1 << (x * hh + y)
+                    if p1 & bit:
+                        grid[y][x] = 1
+                    elif p2 & bit:
+                        grid[y][x] = 2
+            self._grid = grid
+        return self._grid
+
+    # Compute the Zobrist keys from scratch.
+    def rekey(self):
+        """Recomputes the Zobrist keys of the position and of its mirror image"""
+        w = self.w
+        hh = self.h + 1
+        self._key = 0
+        self._mirror_key = 0
+        for p in range(2):
+            keys = self.zobrist[p]
+            for x in range(w):
+                for y in range(self.heights[x]):
+                    if self.pos[p] >> (x * hh + y) & 1:
+                        self._key ^= keys[y*w + x]
+                        self._mirror_key ^= keys[y*w + w-1-x]
+
+    # Zobrist key of the position, updated incrementally as tokens are added and removed.
+    #
+    # RETURN [int]: a 64-bit key identifying the token configuration, equal to
+    #               the key of the same position on a board.Board
+    @property
+    def key(self):
+        """Zobrist key of the position"""
+        return self._key
+
+    # Zobrist key of the left-right mirror image of the position.
+    #
+    # RETURN [int]: the key the mirrored position would have
+    @property
+    def mirror_key(self):
+        """Zobrist key of the mirrored position"""
+        return self._mirror_key
+
+    # Key shared by a position and its mirror image.
+    #
+    # RETURN [int]: the smaller of key and mirror_key
+    @property
+    def canonical_key(self):
+        """Key identifying the position up to left-right symmetry"""
+        return min(self._key, self._mirror_key)
+
+    # Clone a board.
+    #
+    # RETURN [bitboard.BitBoard]: a copy of this object
+    def copy(self):
+        """Returns a copy of this board that can be independently modified"""
+        cpy = BitBoard.__new__(BitBoard)
+        cpy.w = self.w
+        cpy.h = self.h
+        cpy.n = self.n
+        cpy.player = self.player
+        cpy.pos = self.pos[:]
+        cpy.mask = self.mask
+        cpy.heights = self.heights[:]
+        cpy.last_move = self.last_move
+        cpy.outcome = self.outcome
+        cpy.history = self.history[:]
+        cpy._grid = None
+        cpy.zobrist = self.zobrist
+        cpy._key = self._key
+        cpy._mirror_key = self._mirror_key
+        return cpy
+
+    # Check if a bitboard contains n aligned tokens.
+    #
+    # PARAM [int] bits: the tokens of one player
+    # RETURN [Bool]: True if n tokens are lined up in any direction
+    def is_win(self, bits):
+        """Return True if the given player bitboard has n tokens in a row"""
+        n = self.n
+        # Vertical, horizontal, diagonal down, diagonal up
+        for s in (1, self.h + 1, self.h, self.h + 2):
+            # After each step, bit i is set iff a run of k tokens starts at i
+            t = bits
+            k = 1
+            while k < n and t:
+                step = min(k, n - k)
+                t &= t >> (s * step)
+                k += step
+            if t:
+                return True
+        return False
+
+    # Check if a token of the given player at (x,y) would complete a line.
+    #
+    # PARAM [int] x:      the x coordinate of the cell, assumed empty
+    # PARAM [int] y:      the y coordinate of the cell
+    # PARAM [int] player: the player
+    # RETURN [Bool]: True if a token of player at (x,y) would line up n tokens
+    def completes_line(self, x, y, player):
+        """Return True if a token of player at (x,y) would complete a line of n"""
+        return self.is_win(self.pos[player-1] | 1 << (x * (self.h + 1) + y))
+
+    # Count the tokens of a player in a rectangle.
+    #
+    # PARAM [int] player: the player, 1 or 2
+    # PARAM [int] x0:     the first column of the rectangle
+    # PARAM [int] y0:     the first row of the rectangle
+    # PARAM [int] x1:     the column after the last one; 0 <= x0 <= x1 <= w
+    # PARAM [int] y1:     the row after the last one; 0 <= y0 <= y1 <= h
+    # RETURN [int]: the number of tokens of player in [x0,x1) x [y0,y1)
+    def count_tokens(self, player, x0, y0, x1, y1):
+        """Returns the number of tokens of player in the rectangle [x0,x1) x [y0,y1)"""
+        k = (self.w, self.h, x0, y0, x1, y1)
+        rect = _RECT_MASKS.get(k)
+        if rect is None:
+            hh = self.h + 1
+            column = ((1 << (y1 - y0)) - 1) << y0 if y1 > y0 else 0
+            rect = 0
+            for x in range(x0, x1):
+                rect |= column << (x * hh)
+            _RECT_MASKS[k] = rect
+        return bin(self.pos[player-1] & rect).count("1")
+
+    # Returns the columns where a player would win right away.
+    #
+    # PARAM [int] player (optional): the player, by default the player to move
+    # RETURN [list of int]: the free columns where a token of player completes a line
+    def winning_moves(self, player=None):
+        """Returns the columns where player (by default the player to move) wins at once"""
+        if player is None:
+            player = self.player
+        h = self.h
+        return [x for x, y in enumerate(self.heights) if y < h and self.completes_line(x, y, player)]
+
+    # Returns the columns the player to move must play to stop the opponent
+    # from winning on the next move.
+    #
+    # RETURN [list of int]: the opponent's winning moves; with more than one,
+    #                       the game is lost
+    def blocking_moves(self):
+        """Returns the columns where the opponent of the player to move would win at once"""
+        return self.winning_moves(3 - self.player)
+
+    # Returns the columns that give the opponent a winning move right above.
+    #
+    # RETURN [list of int]: the free columns where the opponent could win
+    #                       by playing on top of the player to move
+    #
+    # NOTE: Moves that win on the spot are not left out.
+    def losing_moves(self):
+        """Returns the columns where playing lets the opponent win on top"""
+        opp = 3 - self.player
+        h = self.h
+        return [x for x, y in enumerate(self.heights) if y + 1 < h and self.completes_line(x, y + 1, opp)]
+
+    # Find a move that needs no search: a win, a forced block, or the only
+    # move that does not hand the opponent a win.
+    #
+    # RETURN [int]: the column to play, or -1 if the position needs a search
+    def forced_move(self):
+        """Returns the column to play without searching, or -1"""
+        wins = self.winning_moves()
+        if wins:
+            return wins[0]
+        # With more than one block, the game is lost whatever we play
+        blocks = self.blocking_moves()
+        if blocks:
+            return blocks[0]
+        free = self.free_cols()
+        if len(free) == 1:
+            return free[0]
+        losing = self.losing_moves()
+        safe = [x for x in free if x not in losing]
+        if len(safe) == 1:
+            return safe[0]
+        return -1
+
+    # Calculate the game outcome.
+    #
+    # RETURN [int]: 1 for Player 1, 2 for Player 2, and 0 for no winner
+    #
+    # NOTE: The outcome is updated by add_token(), so this is O(1).
+    def get_outcome(self):
+        """Returns the winner of the game: 1 for Player 1, 2 for Player 2, and 0 for no winner"""
+        return self.outcome
+
+    # Adds a token for the current player at the given column
+    #
+    # PARAM [int] x: The column where the token must be added; the column is assumed not full.
+    #
+    # NOTE: This method switches the current player.
+    def add_token(self, x):
+        """Adds a token for the current player at column x; the column is assumed not full"""
+        y = self.heights[x]
+        self.heights[x] = y + 1
+        move = 1 << (x * (self.h + 1) + y)
+        self.pos[self.player-1] |= move
+        self.mask |= move
+        self.history.append((move, self.last_move, self.outcome))
+        self.last_move = (x, y)
+        self._grid = None
+        w = self.w
+        self._key ^= self.zobrist[self.player-1][y*w + x]
+        self._mirror_key ^= self.zobrist[self.player-1][y*w + w-1-x]
+        # Only the player who just moved can have completed a line
+        if self.outcome == 0 and self.is_win(self.pos[self.player-1]):
+            self.outcome = self.player
+        # Switch player
+        if self.player == 1:
+            self.player = 2
+        else:
+            self.player = 1
+
+    # Removes the last token added with add_token()
+    #
+    # NOTE: This method switches the current player back and restores the
+    #       outcome and last move from before that token was added.
+    def undo_token(self):
+        """Removes the last token added, restoring the previous board state"""
+        move, last_move, self.outcome = self.history.pop()
+        x = (move.bit_length() - 1) // (self.h + 1)
+        self.heights[x] -= 1
+        self.last_move = last_move
+        # Switch player back
+        if self.player == 1:
+            self.player = 2
+        else:
+            self.player = 1
+        self.pos[self.player-1] ^= move
+        self.mask ^= move
+        self._grid = None
+        w = self.w
+        y = self.heights[x]
+        self._key ^= self.zobrist[self.player-1][y*w + x]
+        self._mirror_key ^= self.zobrist[self.player-1][y*w + w-1-x]
+
+    # Iterate over the successors of this board, in place.
+    #
+    # RETURN [iterator of (bitboard.BitBoard, int)]: this board with a token
+    #                                               added at each free column
+    #                                               in turn, with that column
+    #
+    # NOTE: Each successor is only valid until the iteration advances.
+    def successors(self):
+        """Yields (self, col) for each free column, with a token temporarily added at col"""
+        for x in self.free_cols():
+            self.add_token(x)
+            try:
+                yield self, x
+            finally:
+                self.undo_token()
+
+    # Returns a list of the columns with at least one free slot.
+    #
+    # RETURN [list of int]: the columns with at least one free slot
+    def free_cols(self):
+        """Returns a list of the columns with at least one free slot"""
+        h = self.h
+        return [x for x, y in enumerate(self.heights) if y < h]
+
+    # Check whether a column has at least one free slot.
+    #
+    # PARAM [int] x: the column
+    # RETURN [Bool]: True if a token can be added at column x
+    def is_free_col(self, x):
+        """Returns True if column x has at least one free slot"""
+        return 0 <= x < self.w and self.heights[x] < self.h
+
+    # Prints the current board state.
+    def print_it(self):
+        grid = self.board
+        print("+", "-" * self.w, "+", sep='')
+        for y in range(self.h-1, -1, -1):
+            print("|", sep='', end='')
+            for x in range(self.w):
+                if grid[y][x] == 0:
+                    print(" ", end='')
+                else:
+                    print(grid[y][x], end='')
+            print("|")
+        print("+", "-" * self.w, "+", sep='')
+        print(" ", end='')
+        for i in range(self.w):
+            print(i, end='')
+        print("")
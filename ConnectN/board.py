@@ -1,4 +1,129 @@
-import copy
+import random
+import struct
+
+###################
+# Zobrist hashing #
+###################
+
+# Zobrist key tables, one per board geometry
+_ZOBRIST_TABLES = {}
+
+# Get the Zobrist key table for a board geometry.
+#
+# PARAM [int] w: the board width
+# PARAM [int] h: the board height
+# RETURN [list of list of int]: for each player, a random 64-bit key per cell,
+#                               with cell (x,y) at index y*w+x
+#
+# NOTE: The tables are generated from a fixed seed, so keys are the same in
+#       every process.
+def zobrist_table(w, h):
+    """Returns the (cached) Zobrist keys for a w x h board"""
+    table = _ZOBRIST_TABLES.get((w, h))
+    if table is None:
+        rng = random.Random("zobrist {}x{}".format(w, h))
+        table = [[rng.getrandbits(64) for i in range(w * h)] for p in range(2)]
+        _ZOBRIST_TABLES[(w, h)] = table
+    return table
+
+###################
+# Winning windows #
+###################
+
+# Winning window indices, one per board geometry
+_WINDOW_INDICES = {}
+
+class WindowIndex(object):
+    """Every winning window of a board geometry, and the windows through each cell"""
+
+    # Class constructor.
+    #
+    # PARAM [int] w: the board width
+    # PARAM [int] h: the board height
+    # PARAM [int] n: the number of tokens to line up to win
+    def __init__(self, w, h, n):
+        """Class constructor"""
+        # All the windows of n cells, each a tuple of (x,y) coordinates
+        self.windows = []
+        # The windows through each cell, indexed [y][x]
+        self.through = [[[] for x in range(w)] for y in range(h)]
+        # The same windows as tuples of flat cell indices y*w+x
+        self.flat_windows = []
+        # The flat windows through each cell, indexed y*w+x
+        self.flat_through = [[] for c in range(w * h)]
+        for dx, dy in ((1, 0), (0, 1), (1, 1), (1, -1)):
+            for y in range(h):
+                for x in range(w):
+                    # Last cell of the window must be on the board
+                    ex = x + (n-1) * dx
+                    ey = y + (n-1) * dy
+                    if ex >= w or ey < 0 or ey >= h:
+                        continue
+                    win = tuple((x + i*dx, y + i*dy) for i in range(n))
+                    self.windows.append(win)
+                    flat = tuple(j*w + i for (i, j) in win)
+                    self.flat_windows.append(flat)
+                    for (i, j) in win:
+                        self.through[j][i].append(win)
+                        self.flat_through[j*w + i].append(flat)
+
+# Get the winning window index for a board geometry.
+#
+# PARAM [int] w: the board width
+# PARAM [int] h: the board height
+# PARAM [int] n: the number of tokens to line up to win
+# RETURN [board.WindowIndex]: the shared window index
+def window_index(w, h, n):
+    """Returns the (cached) winning window index for a w x h board with n to win"""
+    index = _WINDOW_INDICES.get((w, h, n))
+    if index is None:
+        index = WindowIndex(w, h, n)
+        _WINDOW_INDICES[(w, h, n)] = index
+    return index
+
+########
+# Rays #
+########
+
+# Ray tables, one per board geometry and step
+_RAY_TABLES = {}
+
+# Get the rays of a board geometry for one step direction.
+#
+# PARAM [int] w:  the board width
+# PARAM [int] h:  the board height
+# PARAM [int] dx: the step in the x direction
+# PARAM [int] dy: the step in the y direction; (dx,dy) must not be (0,0)
+# RETURN [2D list of tuple of (int, int)]: indexed [y][x], the cells
+#                                          (x+k*dx, y+k*dy) for k = 1, 2, ...
+#                                          that are on the board, nearest first
+def ray_table(w, h, dx, dy):
+    """Returns the (cached) rays from every cell of a w x h board in direction (dx,dy)"""
+    table = _RAY_TABLES.get((w, h, dx, dy))
+    if table is None:
+        table = [[None] * w for y in range(h)]
+        for y in range(h):
+            for x in range(w):
+                ray = []
+                i = x + dx
+                j = y + dy
+                while 0 <= i < w and 0 <= j < h:
+                    ray.append((i, j))
+                    i += dx
+                    j += dy
+                table[y][x] = tuple(ray)
+        _RAY_TABLES[(w, h, dx, dy)] = table
+    return table
+
+########################
+# Packed serialization #
+########################
+
+# Header of a packed position: width, height, tokens to win, current player
+_PACKED_HEADER = struct.Struct("<BBBB")
+
+# The four 2-bit cells of each packed byte, lowest bits first
+_UNPACK_BYTE = [bytes((b >> (2*i)) & 3 for i in range(4)) for b in range(256)]
 
 ##############
 # Game Board #
@@ -6,6 +131,12 @@ import copy
 
 class Board(object):
 
+    # The cells are stored in a single bytearray, row-major, with cell (x,y)
+    # at index y*w+x.
+    __slots__ = ('cells', 'w', 'h', 'n', 'player', 'windows', 'heights',
+                 'last_move', 'outcome', 'history', 'zobrist', '_key', '_mirror_key',
+                 'asymmetry', '_rows', '_sums')
+
     # Class constructor.
     #
     # PARAM [2D list of int] board: the board configuration, row-major
@@ -15,7 +146,13 @@ class Board(object):
     def __init__(self, board, w, h, n):
         """Class constructor"""
         # Board data
-        self.board = board
+        self.cells = bytearray(w * h)
+        for y in range(h):
+            self.cells[y*w:(y+1)*w] = bytes(board[y])
+        # Row-major lists mirroring the cells, built on demand as self.board
+        self._rows = None
+        # Integral images of each player's tokens, built on demand by count_tokens()
+        self._sums = None
         # Board width
         self.w = w
         # Board height
@@ -24,16 +161,237 @@ class Board(object):
         self.n = n
         # Current player
         self.player = 1
+        # Winning windows for this geometry
+        self.windows = window_index(w, h, n)
+        # Number of tokens in each column
+        self.heights = [0] * w
+        for x in range(w):
+            while self.heights[x] < h and self.cells[self.heights[x]*w + x] != 0:
+                self.heights[x] += 1
+        # Last token added, as (x,y), or None
+        self.last_move = None
+        # Cached game outcome, kept up to date by add_token()
+        self.outcome = self.scan_outcome()
+        # Moves made on this board, as (x, y, outcome before the move)
+        self.history = []
+        # Zobrist keys for this geometry and key of the current position
+        self.zobrist = zobrist_table(w, h)
+        self._key = 0
+        # Key of the left-right mirror image of the position
+        self._mirror_key = 0
+        # Number of cell pairs (x,y), (w-1-x,y) holding different tokens
+        self.asymmetry = 0
+        for y in range(h):
+            for x in range(w):
+                t = self.cells[y*w + x]
+                if t != 0:
+                    self._key ^= self.zobrist[t-1][y*w + x]
+                    self._mirror_key ^= self.zobrist[t-1][y*w + w-1-x]
+                if x < w-1-x and t != self.cells[y*w + w-1-x]:
+                    self.asymmetry += 1
+
+    # Row-major view of the board data, for code that uses board[y][x].
+    #
+    # RETURN [2D list of int]: the board configuration, row-major
+    #
+    # NOTE: The view is built on first use and kept in sync by add_token()
+    #       and undo_token(), but writing to it does not change the board.
+    @property
+    def board(self):
+        """Row-major view of the board data"""
+        if self._rows is None:
+            cells = self.cells
+            w = self.w
+            self._rows = [list(cells[y*w:(y+1)*w]) for y in range(self.h)]
+        return self._rows
+
+    # Zobrist key of the position, updated incrementally as tokens are added and removed.
+    #
+    # RETURN [int]: a 64-bit key identifying the token configuration
+    @property
+    def key(self):
+        """Zobrist key of the position"""
+        return self._key
+
+    # Zobrist key of the left-right mirror image of the position.
+    #
+    # RETURN [int]: the key the mirrored position would have
+    @property
+    def mirror_key(self):
+        """Zobrist key of the mirrored position"""
+        return self._mirror_key
+
+    # Key shared by a position and its mirror image.
+    #
+    # RETURN [int]: the smaller of key and mirror_key
+    @property
+    def canonical_key(self):
+        """Key identifying the position up to left-right symmetry"""
+        return min(self._key, self._mirror_key)
+
+    # Whether the position is its own mirror image.
+    #
+    # RETURN [Bool]: True if every cell matches its mirror cell
+    @property
+    def is_symmetric(self):
+        """True if the position is left-right symmetric"""
+        return self.asymmetry == 0
+
+    def __hash__(self):
+        return self._key
+
+    # The key rejects most different positions at once; the cells settle collisions.
+    def __eq__(self, other):
+        return (isinstance(other, Board) and
+                self._key == other._key and
+                self.player == other.player and
+                self.w == other.w and self.h == other.h and self.n == other.n and
+                self.cells == other.cells)
+
+    # The shared tables and row views are rebuilt rather than pickled.
+    def __getstate__(self):
+        return {s: getattr(self, s) for s in Board.__slots__
+                if s not in ('windows', 'zobrist', '_rows', '_sums')}
+
+    def __setstate__(self, state):
+        for s, v in state.items():
+            setattr(self, s, v)
+        self.windows = window_index(self.w, self.h, self.n)
+        self.zobrist = zobrist_table(self.w, self.h)
+        self._rows = None
+        self._sums = None
 
     # Clone a board.
     #
-    # RETURN [board.Board]: a deep copy of this object
+    # RETURN [board.Board]: a copy of this object
     def copy(self):
         """Returns a copy of this board that can be independently modified"""
-        cpy = Board(copy.deepcopy(self.board), self.w, self.h, self.n)
+        cpy = Board.__new__(Board)
+        cpy.cells = self.cells[:]
+        cpy._rows = None
+        # Integral images are cheaper to copy than to rebuild
+        if self._sums is None:
+            cpy._sums = None
+        else:
+            cpy._sums = [[row[:] for row in sums] for sums in self._sums]
+        cpy.w = self.w
+        cpy.h = self.h
+        cpy.n = self.n
         cpy.player = self.player
+        cpy.windows = self.windows
+        cpy.heights = self.heights[:]
+        cpy.last_move = self.last_move
+        cpy.outcome = self.outcome
+        cpy.history = self.history[:]
+        cpy.zobrist = self.zobrist
+        cpy._key = self._key
+        cpy._mirror_key = self._mirror_key
+        cpy.asymmetry = self.asymmetry
+        return cpy
+
+    # Encode the position compactly.
+    #
+    # RETURN [bytes]: a 4-byte header (w, h, n, player) followed by the cells,
+    #                 row-major, packed 2 bits per cell
+    #
+    # NOTE: The encoding depends only on the position, not on the order in
+    #       which the tokens were played, so it can also be used as a
+    #       (hashable) dictionary or on-disk key.
+    def to_bytes(self):
+        """Returns a compact encoding of the position"""
+        cells = self.cells + bytes(-len(self.cells) % 4)
+        packed = bytes(cells[i] | (cells[i+1] << 2) | (cells[i+2] << 4) | (cells[i+3] << 6)
+                       for i in range(0, len(cells), 4))
+        return _PACKED_HEADER.pack(self.w, self.h, self.n, self.player) + packed
+
+    # Decode a position encoded with to_bytes().
+    #
+    # PARAM [bytes] data: the encoded position
+    # RETURN [board.Board]: a new board with that position
+    #
+    # NOTE: The move history is not encoded, so the new board cannot undo
+    #       the moves that led to the position.
+    @classmethod
+    def from_bytes(cls, data):
+        """Returns a board decoded from the output of to_bytes()"""
+        w, h, n, player = _PACKED_HEADER.unpack_from(data)
+        cells = b''.join([_UNPACK_BYTE[b] for b in data[_PACKED_HEADER.size:]])
+        brd = cls([cells[y*w:(y+1)*w] for y in range(h)], w, h, n)
+        brd.player = player
+        return brd
+
+    # Mirror a board left to right.
+    #
+    # RETURN [board.Board]: a copy of this board with column x moved to w-1-x
+    def mirror(self):
+        """Returns a left-right mirrored copy of this board"""
+        w = self.w
+        cpy = self.copy()
+        for y in range(self.h):
+            cpy.cells[y*w:(y+1)*w] = self.cells[y*w:(y+1)*w][::-1]
+        cpy._sums = None
+        cpy.heights.reverse()
+        if self.last_move is not None:
+            cpy.last_move = (w-1-self.last_move[0], self.last_move[1])
+        cpy.history = [(w-1-x, y, o) for (x, y, o) in self.history]
+        cpy._key = self._mirror_key
+        cpy._mirror_key = self._key
         return cpy
 
+    # Count the tokens of a player in a rectangle.
+    #
+    # PARAM [int] player: the player, 1 or 2
+    # PARAM [int] x0:     the first column of the rectangle
+    # PARAM [int] y0:     the first row of the rectangle
+    # PARAM [int] x1:     the column after the last one; 0 <= x0 <= x1 <= w
+    # PARAM [int] y1:     the row after the last one; 0 <= y0 <= y1 <= h
+    # RETURN [int]: the number of tokens of player in [x0,x1) x [y0,y1)
+    #
+    # NOTE: The first call builds an integral image of each player's tokens,
+    #       which add_token(), undo_token() and copy() then keep up to date,
+    #       so every later count is O(1).
+    def count_tokens(self, player, x0, y0, x1, y1):
+        """Returns the number of tokens of player in the rectangle [x0,x1) x [y0,y1)"""
+        if self._sums is None:
+            self.build_sums()
+        sums = self._sums[player-1]
+        return sums[y1][x1] - sums[y0][x1] - sums[y1][x0] + sums[y0][x0]
+
+    # Build the integral images used by count_tokens().
+    #
+    # NOTE: sums[p][j][i] is the number of tokens of player p+1 in [0,i) x [0,j).
+    def build_sums(self):
+        """Computes the integral image of each player's tokens"""
+        w = self.w
+        cells = self.cells
+        self._sums = []
+        for player in (1, 2):
+            sums = [[0] * (w+1)]
+            for y in range(self.h):
+                above = sums[-1]
+                row = [0] * (w+1)
+                run = 0
+                for x in range(w):
+                    if cells[y*w + x] == player:
+                        run += 1
+                    row[x+1] = above[x+1] + run
+                sums.append(row)
+            self._sums.append(sums)
+
+    # Update the integral images for a token added or removed at (x,y).
+    #
+    # PARAM [int] player: the player of the token
+    # PARAM [int] x:      the x coordinate of the token
+    # PARAM [int] y:      the y coordinate of the token
+    # PARAM [int] delta:  1 for an added token, -1 for a removed one
+    def update_sums(self, player, x, y, delta):
+        """Adds delta to every integral image entry covering (x,y)"""
+        sums = self._sums[player-1]
+        for j in range(y+1, self.h+1):
+            row = sums[j]
+            for i in range(x+1, self.w+1):
+                row[i] += delta
+
     # Check if a line of identical tokens exists starting at (x,y) in direction (dx,dy)
     #
     # PARAM [int] x:  the x coordinate of the starting cell
@@ -48,10 +406,12 @@ class Board(object):
             (y + (self.n-1) * dy < 0) or (y + (self.n-1) * dy >= self.h)):
             return False
         # Get token at (x,y)
-        t = self.board[y][x]
+        c = y*self.w + x
+        t = self.cells[c]
         # Go through elements
+        step = dy*self.w + dx
         for i in range(1, self.n):
-            if self.board[y + i*dy][x + i*dx] != t:
+            if self.cells[c + i*step] != t:
                 return False
         return True
 
@@ -67,16 +427,121 @@ class Board(object):
                 self.is_line_at(x, y, 1, 1) or # Diagonal up
                 self.is_line_at(x, y, 1, -1)) # Diagonal down
 
+    # Check if a line of n identical tokens passes through (x,y) in any direction
+    #
+    # PARAM [int] x:  the x coordinate of the cell
+    # PARAM [int] y:  the y coordinate of the cell
+    # RETURN [Bool]: True if n tokens of the same type have been found, False otherwise
+    def is_line_through(self, x, y):
+        """Return True if a line of n identical tokens passes through (x,y)"""
+        cells = self.cells
+        c = y*self.w + x
+        t = cells[c]
+        for win in self.windows.flat_through[c]:
+            for i in win:
+                if cells[i] != t:
+                    break
+            else:
+                return True
+        return False
+
+    # Check if a token of the given player at (x,y) would complete a line.
+    #
+    # PARAM [int] x:      the x coordinate of the cell, assumed empty
+    # PARAM [int] y:      the y coordinate of the cell
+    # PARAM [int] player: the player
+    # RETURN [Bool]: True if a token of player at (x,y) would line up n tokens
+    def completes_line(self, x, y, player):
+        """Return True if a token of player at (x,y) would complete a line of n"""
+        cells = self.cells
+        c = y*self.w + x
+        for win in self.windows.flat_through[c]:
+            for i in win:
+                if cells[i] != player and i != c:
+                    break
+            else:
+                return True
+        return False
+
+    # Returns the columns where a player would win right away.
+    #
+    # PARAM [int] player (optional): the player, by default the player to move
+    # RETURN [list of int]: the free columns where a token of player completes a line
+    def winning_moves(self, player=None):
+        """Returns the columns where player (by default the player to move) wins at once"""
+        if player is None:
+            player = self.player
+        h = self.h
+        return [x for x, y in enumerate(self.heights) if y < h and self.completes_line(x, y, player)]
+
+    # Returns the columns the player to move must play to stop the opponent
+    # from winning on the next move.
+    #
+    # RETURN [list of int]: the opponent's winning moves; with more than one,
+    #                       the game is lost
+    def blocking_moves(self):
+        """Returns the columns where the opponent of the player to move would win at once"""
+        return self.winning_moves(3 - self.player)
+
+    # Returns the columns that give the opponent a winning move right above.
+    #
+    # RETURN [list of int]: the free columns where the opponent could win
+    #                       by playing on top of the player to move
+    #
+    # NOTE: Moves that win on the spot are not left out.
+    def losing_moves(self):
+        """Returns the columns where playing lets the opponent win on top"""
+        opp = 3 - self.player
+        h = self.h
+        return [x for x, y in enumerate(self.heights) if y + 1 < h and self.completes_line(x, y + 1, opp)]
+
+    # Find a move that needs no search: a win, a forced block, or the only
+    # move that does not hand the opponent a win.
+    #
+    # RETURN [int]: the column to play, or -1 if the position needs a search
+    def forced_move(self):
+        """Returns the column to play without searching, or -1"""
+        wins = self.winning_moves()
+        if wins:
+            return wins[0]
+        # With more than one block, the game is lost whatever we play
+        blocks = self.blocking_moves()
+        if blocks:
+            return blocks[0]
+        free = self.free_cols()
+        if len(free) == 1:
+            return free[0]
+        losing = self.losing_moves()
+        safe = [x for x in free if x not in losing]
+        if len(safe) == 1:
+            return safe[0]
+        return -1
+
+    # Calculate the game outcome by scanning the whole board.
+    #
+    # RETURN [int]: 1 for Player 1, 2 for Player 2, and 0 for no winner
+    def scan_outcome(self):
+        """Returns the winner of the game computed from scratch"""
+        cells = self.cells
+        for win in self.windows.flat_windows:
+            t = cells[win[0]]
+            if t == 0:
+                continue
+            for i in win:
+                if cells[i] != t:
+                    break
+            else:
+                return t
+        return 0
+
     # Calculate the game outcome.
     #
     # RETURN [int]: 1 for Player 1, 2 for Player 2, and 0 for no winner
+    #
+    # NOTE: The outcome is updated by add_token(), so this is O(1).
     def get_outcome(self):
         """Returns the winner of the game: 1 for Player 1, 2 for Player 2, and 0 for no winner"""
-        for x in range(self.w):
-            for y in range(self.h):
-                if (self.board[y][x] != 0) and self.is_any_line_at(x,y):
-                    return self.board[y][x]
-        return 0
+        return self.outcome
 
     # Adds a token for the current player at the given column
     #
@@ -86,22 +551,94 @@ class Board(object):
     def add_token(self, x):
         """Adds a token for the current player at column x; the column is assumed not full"""
         # Find empty slot for token
-        y = 0
-        while self.board[y][x] != 0:
-            y = y + 1
-        self.board[y][x] = self.player
+        y = self.heights[x]
+        self.heights[x] = y + 1
+        w = self.w
+        c = y*w + x
+        m = y*w + w-1-x
+        self.cells[c] = self.player
+        if self._rows is not None:
+            self._rows[y][x] = self.player
+        if self._sums is not None:
+            self.update_sums(self.player, x, y, 1)
+        self._key ^= self.zobrist[self.player-1][c]
+        self._mirror_key ^= self.zobrist[self.player-1][m]
+        if m != c:
+            self.asymmetry += (self.cells[m] != self.player) - (self.cells[m] != 0)
+        self.history.append((x, y, self.outcome))
+        self.last_move = (x, y)
+        # Only lines through the new token can have changed the outcome
+        if self.outcome == 0 and self.is_line_through(x, y):
+            self.outcome = self.player
         # Switch player
         if self.player == 1:
             self.player = 2
         else:
             self.player = 1
 
+    # Removes the last token added with add_token()
+    #
+    # NOTE: This method switches the current player back and restores the
+    #       outcome and last move from before that token was added.
+    def undo_token(self):
+        """Removes the last token added, restoring the previous board state"""
+        x, y, self.outcome = self.history.pop()
+        w = self.w
+        c = y*w + x
+        m = y*w + w-1-x
+        if self._sums is not None:
+            self.update_sums(self.cells[c], x, y, -1)
+        self.cells[c] = 0
+        if self._rows is not None:
+            self._rows[y][x] = 0
+        self.heights[x] = y
+        if self.history:
+            self.last_move = self.history[-1][:2]
+        else:
+            self.last_move = None
+        # Switch player back
+        if self.player == 1:
+            self.player = 2
+        else:
+            self.player = 1
+        self._key ^= self.zobrist[self.player-1][c]
+        self._mirror_key ^= self.zobrist[self.player-1][m]
+        if m != c:
+            self.asymmetry -= (self.cells[m] != self.player) - (self.cells[m] != 0)
+
+    # Iterate over the successors of this board, in place.
+    #
+    # RETURN [iterator of (board.Board, int)]: this board with a token added
+    #                                         at each free column in turn,
+    #                                         along with that column
+    #
+    # NOTE: Each successor is only valid until the iteration advances; the
+    #       token is removed again before the next one is produced, and when
+    #       the iteration stops early.
+    def successors(self):
+        """Yields (self, col) for each free column, with a token temporarily added at col"""
+        for x in self.free_cols():
+            self.add_token(x)
+            try:
+                yield self, x
+            finally:
+                self.undo_token()
+
     # Returns a list of the columns with at least one free slot.
     #
     # RETURN [list of int]: the columns with at least one free slot
     def free_cols(self):
         """Returns a list of the columns with at least one free slot"""
-        return [x for x in range(self.w) if self.board[-1][x] == 0 ]
+        h = self.h
+        return [x for x, y in enumerate(self.heights) if y < h]
+
+    # Check whether a column has at least one free slot.
+    #
+    # PARAM [int] x: the column
+    # RETURN [Bool]: True if a token can be added at column x
+    def is_free_col(self, x):
+        """Returns True if column x has at least one free slot"""
+        return 0 <= x < self.w and self.heights[x] < self.h
 
     # Prints the current board state.
     def print_it(self):
@@ -109,10 +646,11 @@ class Board(object):
         for y in range(self.h-1, -1, -1):
             print("|", sep='', end='')
             for x in range(self.w):
-                if self.board[y][x] == 0:
+                t = self.cells[y*self.w + x]
+                if t == 0:
                     print(" ", end='')
                 else:
-                    print(self.board[y][x], end='')
+                    print(t, end='')
             print("|")
         print("+", "-" * self.w, "+", sep='')
         print(" ", end='')
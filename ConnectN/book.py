@@ -0,0 +1,176 @@
+import mmap
+import multiprocessing
+import struct
+import sys
+
+import board
+import ordering
+import search
+import transposition
+
+################
+# Opening Book #
+################
+
+# Book file layout: a header with a magic number, the board geometry and the
+# number of entries, followed by the entries sorted by key. Each entry is the
+# canonical key of a position (see board.Board.canonical_key) and the move to
+# play in the orientation that has that key.
+_MAGIC = b"CNOB"
+_HEADER = struct.Struct("<4sBBBxI")
+_ENTRY = struct.Struct("<QB")
+
+class OpeningBook(object):
+    """Read-only, memory-mapped table of precomputed opening moves"""
+
+    # Class constructor.
+    #
+    # PARAM [string] path: the book file, as written by write_book()
+    def __init__(self, path):
+        """Class constructor"""
+        with open(path, "rb") as f:
+            # The file is mapped read-only, so lookups only touch the pages they need
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, w, h, n, count = _HEADER.unpack_from(self.data)
+        if magic != _MAGIC:
+            raise ValueError("{} is not an opening book".format(path))
+        # Board geometry of the book
+        self.geometry = (w, h, n)
+        # Number of entries
+        self.count = count
+
+    # Number of positions in the book.
+    def __len__(self):
+        return self.count
+
+    # Look up the book move of a board.
+    #
+    # PARAM [board.Board] brd: the board state
+    # RETURN [int]: the column to play, or -1 if the position is not in the book
+    #               or its move is not legal on brd
+    def lookup(self, brd):
+        """Returns the book move for brd, or -1"""
+        if (brd.w, brd.h, brd.n) != self.geometry:
+            return -1
+        key = brd.canonical_key
+        data = self.data
+        lo = 0
+        hi = self.count
+        # Binary search over the sorted entries
+        while lo < hi:
+            mid = (lo + hi) // 2
+            k, move = _ENTRY.unpack_from(data, _HEADER.size + mid * _ENTRY.size)
+            if k < key:
+                lo = mid + 1
+            elif k > key:
+                hi = mid
+            else:
+                # The move was stored for the orientation with the smaller key
+                if brd.key != key:
+                    move = brd.w - 1 - move
+                # A corrupted book or a key collision must not play into a full column
+                if not brd.is_free_col(move):
+                    return -1
+                return move
+        return -1
+
+    # Release the memory map.
+    def close(self):
+        """Closes the book file"""
+        self.data.close()
+
+# Write a book file.
+#
+# PARAM [string]                path:    the file to write
+# PARAM [int]                   w:       the board width
+# PARAM [int]                   h:       the board height
+# PARAM [int]                   n:       the number of tokens to line up to win
+# PARAM [dict of int: int]      entries: the move of each position, by canonical key
+def write_book(path, w, h, n, entries):
+    """Writes the given positions and moves to a book file"""
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, w, h, n, len(entries)))
+        for key in sorted(entries):
+            f.write(_ENTRY.pack(key, entries[key]))
+
+# List the opening positions to put in a book.
+#
+# PARAM [int] w:     the board width
+# PARAM [int] h:     the board height
+# PARAM [int] n:     the number of tokens to line up to win
+# PARAM [int] plies: the number of moves from the empty board
+# RETURN [list of board.Board]: every unfinished position up to plies moves
+#                               deep, one per mirror pair, in the orientation
+#                               with the smaller key
+def opening_positions(w, h, n, plies):
+    """Returns the distinct positions reachable in at most plies moves"""
+    seen = set()
+    positions = []
+    level = [board.Board([[0] * w for y in range(h)], w, h, n)]
+    for ply in range(plies + 1):
+        following = []
+        for brd in level:
+            key = brd.canonical_key
+            if key in seen or brd.get_outcome() != 0 or not brd.free_cols():
+                continue
+            seen.add(key)
+            if brd.key != key:
+                brd = brd.mirror()
+            positions.append(brd)
+            if ply < plies:
+                for x in brd.free_cols():
+                    child = brd.copy()
+                    child.add_token(x)
+                    following.append(child)
+        level = following
+    return positions
+
+# Search one book position; run in the worker processes of build_book().
+#
+# PARAM [(board.Board, function, float, number)] job: the board, the evaluation
+#                                                     function, the time budget
+#                                                     and the win score
+# RETURN [(int, int)]: the canonical key of the board and its best move
+def _search_position(job):
+    """Returns (key, move) for one book position"""
+    (brd, evaluate, time_limit, win) = job
+    searcher = search.Searcher(evaluate, time_limit, win=win,
+                               tt=transposition.TranspositionTable(16),
+                               orderer=ordering.MoveOrderer(), pvs=True)
+    return brd.key, searcher.search(brd)
+
+# Build a book by searching every opening position.
+#
+# PARAM [string]   path:       the file to write
+# PARAM [int]      w:          the board width
+# PARAM [int]      h:          the board height
+# PARAM [int]      n:          the number of tokens to line up to win
+# PARAM [int]      plies:      the depth of the book, in moves from the empty board
+# PARAM [function] evaluate:   the evaluation function, see search.Searcher; it is
+#                              sent to the worker processes, so it must be picklable
+# PARAM [float]    time_limit: the search time per position, in seconds
+# PARAM [number]   win:        the score of a won position, see search.Searcher
+# PARAM [int]      workers:    the number of processes, or None for one per CPU
+# RETURN [int]: the number of positions in the book
+def build_book(path, w, h, n, plies, evaluate, time_limit, win=1000000000, workers=None):
+    """Searches the opening positions in parallel and writes the book to path"""
+    positions = opening_positions(w, h, n, plies)
+    jobs = [(brd, evaluate, time_limit, win) for brd in positions]
+    with multiprocessing.Pool(workers) as pool:
+        entries = dict(pool.imap_unordered(_search_position, jobs))
+    write_book(path, w, h, n, entries)
+    return len(entries)
+
+#
+# Build a book with the evaluation of LessardPhilippe's agent
+#
+if __name__ == "__main__":
+    if not len(sys.argv) == 7:
+        print("Usage:\n  {} <book file> <board width> <board height> <tokens to win> <plies> <seconds per position>".format(sys.argv[0]))
+        sys.exit(1)
+    from LessardPhilippe.alpha_beta_agent import AlphaBetaAgent
+    evaluator = AlphaBetaAgent("book", 4)
+    count = build_book(sys.argv[1], int(sys.argv[2]), int(sys.argv[3]), int(sys.argv[4]),
+                       int(sys.argv[5]), evaluator.evaluate, float(sys.argv[6]),
+                       win=10 * evaluator.WIN)
+    print(count, "positions written to", sys.argv[1])
@@ -0,0 +1,68 @@
+import collections
+
+#############
+# LRU Cache #
+#############
+
+class LRUCache(object):
+    """Bounded mapping that evicts the least recently used entry when full"""
+
+    # Class constructor.
+    #
+    # PARAM [int] capacity: the maximum number of entries
+    def __init__(self, capacity):
+        """Class constructor"""
+        # Maximum number of entries
+        self.capacity = capacity
+        # Entries, least recently used first
+        self.entries = collections.OrderedDict()
+        # Lookups that found an entry, and those that did not
+        self.hits = 0
+        self.misses = 0
+
+    # Number of entries.
+    def __len__(self):
+        return len(self.entries)
+
+    # Look up a value.
+    #
+    # PARAM [hashable] key: the key of the entry
+    # RETURN [any]: the value stored under key, or None if there is none
+    def get(self, key):
+        """Returns the value stored under key, or None, and marks it as recently used"""
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return value
+
+    # Store a value.
+    #
+    # PARAM [hashable] key:   the key of the entry
+    # PARAM [any]      value: the value to store; None can't be told apart from a miss
+    def put(self, key, value):
+        """Stores value under key, evicting the least recently used entry if the cache is full"""
+        entries = self.entries
+        entries[key] = value
+        entries.move_to_end(key)
+        if len(entries) > self.capacity:
+            entries.popitem(last=False)
+
+    # Empty the cache and reset the counters.
+    def clear(self):
+        """Removes every entry"""
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    # Fraction of lookups that found an entry.
+    #
+    # RETURN [float]: the hit rate, or 0 before any lookup
+    def hit_rate(self):
+        """Returns hits / (hits + misses)"""
+        lookups = self.hits + self.misses
+        if lookups == 0:
+            return 0.0
+        return self.hits / lookups
@@ -1,5 +1,6 @@
 import board
 import agent
+import json
 import time
 from pathlib import Path
 
@@ -17,14 +18,17 @@ class Game(object):
     # PARAM [int]         n:  the number of tokens to line up to win
     # PARAM [agent.Agent] p1: the agent for Player 1
     # PARAM [agent.Agent] p2: the agent for Player 2
-    def __init__(self, w, h, n, p1, p2):
+    # PARAM [class]       board_type: the board implementation, board.Board or bitboard.BitBoard
+    def __init__(self, w, h, n, p1, p2, board_type=board.Board):
         """Class constructor"""
         # Create board
-        self.board = board.Board([[0] * w for i in range(h)], w, h, n)
+        self.board = board_type([[0] * w for i in range(h)], w, h, n)
         # Players
         self.players = [ p1, p2 ]
         p1.player = 1
         p2.player = 2
+        # Search statistics of each move, for the agents that keep them
+        self.stats = []
 
     # Execute the game.
     #
@@ -37,6 +41,7 @@ class Game(object):
             self.board.print_it()
             # Copy board so player can't modify it
             x = self.players[p].go(self.board.copy())
+            self.record_stats(p, x)
             print(self.players[p].name, "move:", x)
             if not x in self.board.free_cols():
                 print("Illegal move")
@@ -80,6 +85,7 @@ class Game(object):
             x = self.players[p].go(self.board.copy())
             # Get elapsed time
             et = time.time() - st
+            self.record_stats(p, x)
             # Is the move legal and within the time limit?
             if (not x in self.board.free_cols()) or (et > limit):
                 outcome = 1
@@ -118,6 +124,7 @@ class Game(object):
                 x = self.players[p].go(self.board.copy())
                 # Get elapsed time
                 et = time.time() - st
+                self.record_stats(p, x)
                 # Is the move legal and within the time limit?
                 if (not x in self.board.free_cols()) or (et > limit):
                     # Illegal/out of time, nothing to log, end of game
@@ -141,3 +148,27 @@ class Game(object):
                 log.write("{} wins\n".format(self.players[self.board.get_outcome()-1].name))
         # Return game outcome
         return self.board.get_outcome()
+
+    # Record the search statistics of a move.
+    #
+    # PARAM [int] p: the index of the player who moved, 0 or 1
+    # PARAM [int] x: the column played, not yet added to the board
+    def record_stats(self, p, x):
+        """Stores the statistics of the last move, if the agent keeps any"""
+        player = self.players[p]
+        # Agents that don't run Agent.__init__ have no stats attribute
+        stats = getattr(player, "stats", None)
+        if stats is None:
+            return
+        entry = {"ply": sum(self.board.heights), "player": player.name, "column": x}
+        entry.update(stats.as_dict())
+        self.stats.append(entry)
+
+    # Write the search statistics of the game, one JSON object per line.
+    #
+    # PARAM [string] path: the file to append to
+    def dump_stats(self, path):
+        """Appends the statistics of every move to path, as JSON lines"""
+        with Path(path).open("a") as out:
+            for entry in self.stats:
+                out.write(json.dumps(entry) + "\n")
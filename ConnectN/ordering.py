@@ -0,0 +1,87 @@
+#################
+# Move Ordering #
+#################
+
+# Static center-first orders, one per board width
+_CENTER_ORDERS = {}
+
+# Get the columns of a board, center first.
+#
+# PARAM [int] w: the board width
+# RETURN [list of int]: the columns, sorted by distance to the center
+def center_order(w):
+    """Returns the columns 0..w-1 sorted by distance to the center"""
+    order = _CENTER_ORDERS.get(w)
+    if order is None:
+        # Stable sort: on even widths, the left one of two equidistant columns comes first
+        order = sorted(range(w), key=lambda x: abs(2 * x - (w - 1)))
+        _CENTER_ORDERS[w] = order
+    return order
+
+class MoveOrderer(object):
+    """Orders moves by transposition table move, killer moves, history and center distance"""
+
+    # Class constructor.
+    #
+    # PARAM [int] killers: the number of killer moves kept per ply
+    def __init__(self, killers=2):
+        """Class constructor"""
+        # Number of killer moves per ply
+        self.killers = killers
+        # Killer moves, per ply, most recent first
+        self.killer_moves = []
+        # History scores, per player and column
+        self.history = [{}, {}]
+
+    # Prepare for a new search.
+    #
+    # NOTE: Killer moves are forgotten and history scores are halved, so
+    #       what was learnt in the previous search still counts, but less.
+    def new_search(self):
+        """Resets the killer moves and ages the history scores"""
+        self.killer_moves = []
+        for table in self.history:
+            for x in table:
+                table[x] //= 2
+
+    # List the moves to search, best candidates first.
+    #
+    # PARAM [board.Board] brd:     the board state
+    # PARAM [int]         ply:     the distance of brd from the root
+    # PARAM [int]         tt_move: the move stored in the transposition table, or -1
+    # RETURN [list of int]: the free columns, in search order
+    def order(self, brd, ply, tt_move=-1):
+        """Returns the free columns of brd in search order"""
+        h = brd.h
+        heights = brd.heights
+        history = self.history[brd.player-1]
+        moves = [x for x in center_order(brd.w) if heights[x] < h]
+        # Stable sort, so equal history scores stay center first
+        moves.sort(key=lambda x: -history.get(x, 0))
+        if ply < len(self.killer_moves):
+            for x in reversed(self.killer_moves[ply]):
+                if x in moves:
+                    moves.remove(x)
+                    moves.insert(0, x)
+        if tt_move in moves:
+            moves.remove(tt_move)
+            moves.insert(0, tt_move)
+        return moves
+
+    # Record a move that caused a beta cutoff.
+    #
+    # PARAM [int] player: the player who made the move
+    # PARAM [int] move:   the move
+    # PARAM [int] ply:    the distance from the root of the board the move was made on
+    # PARAM [int] depth:  the remaining search depth at that board
+    def cutoff(self, player, move, ply, depth):
+        """Updates the killer moves and history scores after a beta cutoff"""
+        while len(self.killer_moves) <= ply:
+            self.killer_moves.append([])
+        killers = self.killer_moves[ply]
+        if move in killers:
+            killers.remove(move)
+        killers.insert(0, move)
+        del killers[self.killers:]
+        history = self.history[player-1]
+        history[move] = history.get(move, 0) + depth * depth
@@ -0,0 +1,233 @@
+import multiprocessing
+import weakref
+from multiprocessing import shared_memory
+
+import ordering
+import search
+import transposition
+
+####################
+# Lazy SMP Search  #
+####################
+
+# Lazy SMP: several processes search the same root at the same time and only
+# communicate through a shared transposition table. Helpers start at
+# different depths and try the root moves in a different order, so they fill
+# the table with results the main search picks up as cutoffs and move hints.
+# The main search runs in the calling process and its move is the one played.
+#
+# With pondering, the helpers keep going after a move is played: they search
+# the position after the predicted reply of the opponent until the next
+# search starts, the searcher is closed or their ponder time runs out. If the
+# prediction was right, that search finds the results in the table; if not,
+# it has lost nothing.
+
+class HelperSearcher(search.Searcher):
+    """Searcher run by a helper process; stops when the main search is done"""
+
+    # Class constructor.
+    #
+    # PARAM [int]                     index:      the helper number, from 1
+    # PARAM [multiprocessing.Value]   generation: the number of the current search,
+    #                                             bumped when the main search is done
+    # PARAM [dict]                    options:    the keyword arguments of search.Searcher
+    def __init__(self, index, generation, **options):
+        """Class constructor"""
+        super().__init__(**options)
+        # Helper number
+        self.index = index
+        # Shared search number, and the one of the search in progress
+        self.generation = generation
+        self.job = 0
+
+    # Check whether the search must stop.
+    #
+    # RETURN [Bool]: True once the time budget is spent or the main search is done
+    def out_of_time(self):
+        """Returns True if the search must stop"""
+        return self.generation.value != self.job or super().out_of_time()
+
+    # Leave the shared transposition table alone; the main process clears it
+    # before sending a board of another geometry.
+    def new_geometry(self, brd):
+        """Does nothing in a helper"""
+        pass
+
+    # List the moves to search, best candidates first.
+    #
+    # NOTE: At the root, the moves are rotated by the helper number, so the
+    #       helpers start in different subtrees.
+    def order_moves(self, brd, ply, tt_move):
+        """Returns the free columns of brd in search order"""
+        moves = super().order_moves(brd, ply, tt_move)
+        if ply == 0:
+            i = self.index % len(moves)
+            moves = moves[i:] + moves[:i]
+        return moves
+
+# Main loop of a helper process.
+#
+# PARAM [int]                          index:      the helper number, from 1
+# PARAM [shared_memory.SharedMemory]   shm:        the memory of the shared transposition table
+# PARAM [multiprocessing.Queue]        jobs:       the boards to search, with their search
+#                                                  number and time budget; None to quit
+# PARAM [multiprocessing.Value]        generation: the number of the current search
+# PARAM [dict]                         options:    the keyword arguments of search.Searcher
+def _helper(index, shm, jobs, generation, options):
+    """Searches the boards sent by the main process until told to quit"""
+    tt = transposition.TranspositionTable(buffer=shm.buf)
+    searcher = HelperSearcher(index, generation, tt=tt, **options)
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        (searcher.job, brd, searcher.time_limit) = job
+        # Odd helpers skip the first iteration to get ahead of the others
+        searcher.search(brd, 1 + index % 2)
+
+# Stop the helper processes and free the shared memory.
+#
+# PARAM [shared_memory.SharedMemory]      shm:        the memory of the shared transposition table
+# PARAM [memoryview]                      table:      the view of it used by this process
+# PARAM [multiprocessing.Value]           generation: the number of the current search
+# PARAM [list of multiprocessing.Queue]   queues:     the job queues of the helpers
+# PARAM [list of multiprocessing.Process] processes:  the helpers
+def _shutdown(shm, table, generation, queues, processes):
+    """Stops the helpers and releases the shared transposition table"""
+    # Interrupt any search in progress, pondering included
+    generation.value += 1
+    for q in queues:
+        q.put(None)
+    for p in processes:
+        p.join(1)
+        if p.is_alive():
+            p.terminate()
+    table.release()
+    shm.close()
+    shm.unlink()
+
+class ParallelSearcher(search.Searcher):
+    """Lazy SMP search: helper processes share the transposition table of the main search"""
+
+    # Class constructor.
+    #
+    # PARAM [function] evaluate:   the evaluation function, see search.Searcher; it is
+    #                              sent to the helpers, so it must be picklable
+    # PARAM [float]    time_limit: the time budget of a search, in seconds
+    # PARAM [int]      workers:    the number of searching processes, including this one
+    # PARAM [float]    tt_megabytes: the size of the shared transposition table
+    # PARAM [Bool]     ponder:     if True, search the predicted next position
+    #                              between moves; this needs a helper, so one is
+    #                              started for pondering only if workers is 1
+    # PARAM [float]    ponder_time: the longest the helpers ponder after a move, in
+    #                               seconds; by default time_limit
+    # PARAM [dict]     options:    other keyword arguments of search.Searcher,
+    #                              except tt and orderer
+    #
+    # NOTE: Each process gets its own move orderer. Only this process uses
+    #       the endgame solver, if one is given.
+    def __init__(self, evaluate, time_limit, workers, tt_megabytes=16, ponder=False, ponder_time=None,
+                 **options):
+        """Class constructor"""
+        size = transposition.TranspositionTable.bytes_for(
+            int(tt_megabytes * 1024 * 1024) // transposition.TranspositionTable.bytes_for(1))
+        # Shared memory starts zeroed, which is an empty table
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+        options.update(evaluate=evaluate, time_limit=time_limit)
+        super().__init__(tt=transposition.TranspositionTable(buffer=self.shm.buf),
+                         orderer=ordering.MoveOrderer(), **options)
+        # Number of the current search, shared with the helpers
+        self.generation = multiprocessing.Value('q', 0, lock=False)
+        # Number of helpers that search along with this process
+        self.helpers = workers - 1
+        # Pondering, its time budget, and the key of the position being pondered, or None
+        self.ponder = ponder
+        self.ponder_time = time_limit if ponder_time is None else ponder_time
+        self.pondering = None
+        # Number of searches that started from the pondered position
+        self.ponder_hits = 0
+        # One job queue per helper
+        self.queues = []
+        self.processes = []
+        for i in range(1, max(workers, 2 if ponder else 1)):
+            q = multiprocessing.Queue()
+            p = multiprocessing.Process(target=_helper,
+                                        args=(i, self.shm, q, self.generation,
+                                              dict(options, orderer=ordering.MoveOrderer(), solver=None)),
+                                        daemon=True)
+            p.start()
+            self.queues.append(q)
+            self.processes.append(p)
+        # Release the helpers and the shared memory with this object, or at exit
+        self._finalizer = weakref.finalize(self, _shutdown, self.shm, self.tt.table,
+                                           self.generation, self.queues, self.processes)
+
+    # Search for the best move.
+    #
+    # PARAM [board.Board] brd: the current board state; it is modified during
+    #                          the search and restored before returning
+    # PARAM [int]         first_depth (optional): the depth of the first iteration
+    # RETURN [int]: the best move of the main search
+    def search(self, brd, first_depth=1):
+        """Returns the best move found by the main search, helped by the other processes"""
+        if self.pondering is not None and self.pondering == brd.key:
+            self.ponder_hits += 1
+        self.stop_pondering()
+        # Clear the shared table while no helper is searching
+        self.new_geometry(brd)
+        job = self.generation.value + 1
+        self.generation.value = job
+        # The queues pickle in the background, so send a copy the search can't change
+        snapshot = brd.copy()
+        for q in self.queues[:self.helpers]:
+            q.put((job, snapshot, self.time_limit))
+        try:
+            move = super().search(brd, first_depth)
+        finally:
+            # Tell the helpers to stop
+            self.generation.value = job + 1
+        if self.ponder:
+            self.start_pondering(brd, move)
+        return move
+
+    # Let the helpers search the position expected after a move and the
+    # opponent's reply, until the next search.
+    #
+    # PARAM [board.Board] brd:  the board state the move is played on
+    # PARAM [int]         move: the move about to be played
+    def start_pondering(self, brd, move):
+        """Starts searching the predicted position of the next move in the helpers"""
+        brd.add_token(move)
+        try:
+            if brd.get_outcome() != 0 or not brd.free_cols():
+                return
+            # The opponent is expected to play the best move found for them
+            reply = self.order_moves(brd, 1, self.tt_move(brd))[0]
+            brd.add_token(reply)
+            try:
+                if brd.get_outcome() != 0 or not brd.free_cols():
+                    return
+                self.pondering = brd.key
+                job = self.generation.value + 1
+                self.generation.value = job
+                snapshot = brd.copy()
+                for q in self.queues:
+                    q.put((job, snapshot, self.ponder_time))
+            finally:
+                brd.undo_token()
+        finally:
+            brd.undo_token()
+
+    # Stop the helpers if they are pondering.
+    def stop_pondering(self):
+        """Interrupts the pondering search, if any"""
+        if self.pondering is not None:
+            self.generation.value += 1
+            self.pondering = None
+
+    # Stop the helper processes and free the shared transposition table.
+    def close(self):
+        """Releases the helper processes and the shared memory"""
+        self.stop_pondering()
+        self.tt = None
+        self._finalizer()
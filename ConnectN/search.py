@@ -0,0 +1,412 @@
+import time
+import agent
+import ordering
+import stats
+import transposition
+from transposition import EXACT, LOWER, UPPER
+
+###############################
+# Iterative Deepening Negamax #
+###############################
+
+# Raised inside a search when the time budget runs out.
+class SearchTimeout(Exception):
+    """The search ran out of time"""
+    pass
+
+class Searcher(object):
+    """Iterative deepening negamax with alpha-beta pruning and a time budget"""
+
+    # Class constructor.
+    #
+    # PARAM [function] evaluate:   the evaluation function; evaluate(brd, player)
+    #                              returns the score of brd for player, higher is better
+    # PARAM [float]    time_limit: the time budget of a search, in seconds
+    # PARAM [int]      max_depth:  the maximum search depth, or None for no limit
+    # PARAM [number]   win:        the score of a won position; must be much larger
+    #                              than any score returned by evaluate
+    # PARAM [transposition.TranspositionTable] tt: optional transposition table,
+    #                              kept from one search to the next
+    # PARAM [ordering.MoveOrderer] orderer: optional move orderer; without one,
+    #                              moves are searched left to right
+    # PARAM [bool]     pvs:        if True, use principal variation search: only the
+    #                              first move of a node gets a full window
+    # PARAM [number]   aspiration: if given, start each iteration with a window this
+    #                              wide on each side of the previous iteration's score
+    # PARAM [solver.Solver] solver: optional endgame solver, tried first on the
+    #                              positions it applies to
+    def __init__(self, evaluate, time_limit, max_depth=None, win=1000000000, tt=None, orderer=None,
+                 pvs=False, aspiration=None, solver=None):
+        """Class constructor"""
+        # Endgame solver
+        self.solver = solver
+        # Evaluation function
+        self.evaluate = evaluate
+        # Principal variation search
+        self.pvs = pvs
+        # Aspiration window half-width
+        self.aspiration = aspiration
+        # Transposition table, and the geometry (w, h, n) of its entries
+        self.tt = tt
+        self.geometry = None
+        # Move orderer
+        self.orderer = orderer
+        # Time budget in seconds
+        self.time_limit = time_limit
+        # Depth limit
+        self.max_depth = max_depth
+        # Score of a won position
+        self.win = win
+        # Deadline of the current search
+        self.deadline = 0
+        # Nodes visited in the current search
+        self.nodes = 0
+        # Depth of the last completed iteration, and its score
+        self.depth = 0
+        self.score = 0
+        # Scores beyond +/-(win - max_ply) are proven wins and losses
+        self.max_ply = 0
+        # Statistics of the last search
+        self.stats = stats.SearchStats()
+
+    # Search for the best move.
+    #
+    # PARAM [board.Board] brd: the current board state; it is modified during
+    #                          the search and restored before returning
+    # PARAM [int]         first_depth (optional): the depth of the first iteration
+    # RETURN [int]: the best move of the deepest completed iteration
+    #
+    # NOTE: The statistics of the search are left in self.stats.
+    def search(self, brd, first_depth=1):
+        """Returns the best move found by iterative deepening within the time budget"""
+        self.stats.start()
+        try:
+            return self.deepen(brd, first_depth)
+        finally:
+            self.stats.nodes = self.nodes
+            self.stats.depth = self.depth
+            self.stats.stop()
+
+    # Empty the transposition table when the board geometry changes.
+    #
+    # PARAM [board.Board] brd: the board about to be searched
+    #
+    # NOTE: Keys don't include n, and Zobrist tables are shared by every
+    #       board of the same size, so entries only hold for one geometry.
+    def new_geometry(self, brd):
+        """Clears the transposition table if brd has another geometry than the last search"""
+        geometry = (brd.w, brd.h, brd.n)
+        if geometry != self.geometry:
+            self.geometry = geometry
+            if self.tt is not None:
+                self.tt.clear()
+
+    # Run the iterations of a search, see search().
+    #
+    # PARAM [board.Board] brd:         the current board state
+    # PARAM [int]         first_depth: the depth of the first iteration
+    # RETURN [int]: the best move of the deepest completed iteration
+    def deepen(self, brd, first_depth):
+        """Returns the best move of the deepest iteration completed within the time budget"""
+        self.deadline = time.time() + self.time_limit
+        self.nodes = 0
+        self.depth = 0
+        self.score = 0
+        self.new_geometry(brd)
+        if self.orderer is not None:
+            self.orderer.new_search()
+        # Wins, forced blocks and only moves need no search
+        best = brd.forced_move()
+        if best != -1:
+            return best
+        best = brd.free_cols()[0]
+        self.max_ply = brd.w * brd.h
+        # No point searching deeper than the number of moves left
+        limit = self.max_ply - sum(brd.heights)
+        if self.max_depth is not None:
+            limit = min(limit, self.max_depth)
+        # Solve endgames exactly, leaving half the time for a search if that fails
+        if self.solver is not None and self.solver.applies(brd):
+            try:
+                value, move = self.solver.solve(brd, time.time() + self.time_limit / 2)
+                self.nodes += self.solver.nodes
+                self.depth = self.max_ply - sum(brd.heights)
+                self.score = value * self.win
+                return move
+            except SearchTimeout:
+                pass
+        depth = min(first_depth, limit)
+        while depth <= limit:
+            try:
+                if self.aspiration is not None and self.depth > 0 and abs(self.score) <= self.win - self.max_ply:
+                    # Try a narrow window first, and widen it if the score falls outside
+                    lower = self.score - self.aspiration
+                    upper = self.score + self.aspiration
+                    score, move = self.search_root(brd, depth, lower, upper)
+                    if score <= lower or score >= upper:
+                        score, move = self.search_root(brd, depth)
+                else:
+                    score, move = self.search_root(brd, depth)
+            except SearchTimeout:
+                break
+            best = move
+            self.depth = depth
+            self.score = score
+            # Stop once the game is proven won or lost
+            if abs(score) > self.win - self.max_ply:
+                break
+            depth += 1
+        return best
+
+    # Run one iteration of the search.
+    #
+    # PARAM [board.Board] brd:   the current board state
+    # PARAM [int]         depth: the search depth
+    # PARAM [number]      alpha (optional): the lower bound of the search window
+    # PARAM [number]      beta (optional):  the upper bound of the search window
+    # RETURN [number, int]: the score of the board for the player to move, and the best move
+    def search_root(self, brd, depth, alpha=None, beta=None):
+        """Searches brd to the given depth, returning (score, best move)"""
+        if alpha is None:
+            alpha = -self.win - 1
+        if beta is None:
+            beta = self.win + 1
+        alpha_orig = alpha
+        best_score = -self.win - 1
+        best = -1
+        for move in self.order_moves(brd, 0, self.tt_move(brd)):
+            brd.add_token(move)
+            try:
+                score = self.search_child(brd, depth - 1, alpha, beta, 1, best == -1)
+            finally:
+                brd.undo_token()
+            if score > best_score:
+                best_score = score
+                best = move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        if self.tt is not None:
+            self.tt.store(brd.key, depth, self.bound(best_score, alpha_orig, beta),
+                          self.score_to_tt(best_score, 0), best)
+        return best_score, best
+
+    # Search a child of a node, with a null window in principal variation search.
+    #
+    # PARAM [board.Board] brd:   the child board state
+    # PARAM [int]         depth: the remaining search depth
+    # PARAM [number]      alpha: the lower bound of the parent's search window
+    # PARAM [number]      beta:  the upper bound of the parent's search window
+    # PARAM [int]         ply:   the distance of the child from the root
+    # PARAM [bool]        first: True for the first child searched
+    # RETURN [number]: the score of the child for the player at the parent
+    def search_child(self, brd, depth, alpha, beta, ply, first):
+        """Returns the negamax score of a child board, from the parent's point of view"""
+        if first or not self.pvs:
+            return -self.negamax(brd, depth, -beta, -alpha, ply)
+        # Prove the child is no better than the best so far, and search it
+        # again with the full window if that fails
+        score = -self.negamax(brd, depth, -alpha - 1, -alpha, ply)
+        if alpha < score < beta:
+            score = -self.negamax(brd, depth, -beta, -score, ply)
+        return score
+
+    # Get the bound type of a fail-soft search result.
+    #
+    # PARAM [number] score: the search result
+    # PARAM [number] alpha: the lower bound of the search window
+    # PARAM [number] beta:  the upper bound of the search window
+    # RETURN [int]: transposition.EXACT, LOWER or UPPER
+    def bound(self, score, alpha, beta):
+        """Returns whether score is exact, a lower bound or an upper bound"""
+        if score <= alpha:
+            return UPPER
+        if score >= beta:
+            return LOWER
+        return EXACT
+
+    # Evaluate a board with the negamax version of alpha-beta.
+    #
+    # PARAM [board.Board] brd:   the board state
+    # PARAM [int]         depth: the remaining search depth
+    # PARAM [number]      alpha: the lower bound of the search window
+    # PARAM [number]      beta:  the upper bound of the search window
+    # PARAM [int]         ply:   the distance from the root
+    # RETURN [number]: the score of the board for the player to move
+    def negamax(self, brd, depth, alpha, beta, ply):
+        """Returns the negamax score of brd for the player to move"""
+        self.nodes += 1
+        if self.nodes & 63 == 0 and self.out_of_time():
+            raise SearchTimeout()
+        # The player who just moved won; prefer the quickest wins
+        if brd.get_outcome() != 0:
+            return ply - self.win
+        freecols = brd.free_cols()
+        if not freecols:
+            return 0
+        if depth == 0:
+            self.stats.evals += 1
+            return self.evaluate(brd, brd.player)
+        # Reuse a stored result that is deep enough
+        tt_move = -1
+        if self.tt is not None:
+            self.stats.tt_probes += 1
+            entry = self.tt.probe(brd.key)
+            if entry is not None:
+                self.stats.tt_hits += 1
+                (tt_depth, bound, score, tt_move) = entry
+                if tt_depth >= depth:
+                    score = self.score_from_tt(score, ply)
+                    if bound == EXACT:
+                        return score
+                    if bound == LOWER and score > alpha:
+                        alpha = score
+                    elif bound == UPPER and score < beta:
+                        beta = score
+                    if alpha >= beta:
+                        return score
+        # Settle immediate wins and double threats without searching
+        if brd.winning_moves():
+            return self.win - ply - 1
+        if len(brd.blocking_moves()) > 1:
+            return ply + 2 - self.win
+        alpha_orig = alpha
+        best = -self.win - 1
+        best_move = -1
+        for i, move in enumerate(self.order_moves(brd, ply, tt_move)):
+            brd.add_token(move)
+            try:
+                score = self.search_child(brd, depth - 1, alpha, beta, ply + 1, best_move == -1)
+            finally:
+                brd.undo_token()
+            if score > best:
+                best = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        self.stats.cutoff(i)
+                        if self.orderer is not None:
+                            self.orderer.cutoff(brd.player, move, ply, depth)
+                        break
+        if self.tt is not None:
+            self.tt.store(brd.key, depth, self.bound(best, alpha_orig, beta),
+                          self.score_to_tt(best, ply), best_move)
+        return best
+
+    # Check whether the search must stop.
+    #
+    # RETURN [Bool]: True once the time budget is spent
+    def out_of_time(self):
+        """Returns True if the search must stop"""
+        return time.time() > self.deadline
+
+    # List the moves to search, best candidates first.
+    #
+    # PARAM [board.Board] brd:     the board state
+    # PARAM [int]         ply:     the distance of brd from the root
+    # PARAM [int]         tt_move: the move stored in the transposition table, or -1
+    # RETURN [list of int]: the free columns, in search order
+    #
+    # NOTE: A forced block is the only move searched, and moves that let the
+    #       opponent win on top are left out unless every move does.
+    def order_moves(self, brd, ply, tt_move):
+        """Returns the free columns of brd worth searching, with the stored best move first"""
+        blocks = brd.blocking_moves()
+        if blocks:
+            return blocks[:1]
+        if self.orderer is not None:
+            moves = self.orderer.order(brd, ply, tt_move)
+        else:
+            moves = brd.free_cols()
+            if tt_move in moves:
+                moves.remove(tt_move)
+                moves.insert(0, tt_move)
+        losing = brd.losing_moves()
+        if losing:
+            safe = [x for x in moves if x not in losing]
+            if safe:
+                return safe
+        return moves
+
+    # Get the best move stored for a board.
+    #
+    # PARAM [board.Board] brd: the board state
+    # RETURN [int]: the stored best move, or -1
+    def tt_move(self, brd):
+        """Returns the best move stored in the transposition table for brd, or -1"""
+        if self.tt is None:
+            return -1
+        entry = self.tt.probe(brd.key)
+        if entry is None:
+            return -1
+        return entry[3]
+
+    # Proven wins and losses are stored relative to the node, not the root,
+    # so that they stay valid when the position is reached at another ply.
+    #
+    # PARAM [number] score: the score
+    # PARAM [int]    ply:   the distance of the node from the root
+    # RETURN [number]: the converted score
+    def score_to_tt(self, score, ply):
+        """Converts a root-relative score to a node-relative one"""
+        if score > self.win - self.max_ply:
+            return score + ply
+        if score < self.max_ply - self.win:
+            return score - ply
+        return score
+
+    def score_from_tt(self, score, ply):
+        """Converts a node-relative score to a root-relative one"""
+        if score > self.win - self.max_ply:
+            return score - ply
+        if score < self.max_ply - self.win:
+            return score + ply
+        return score
+
+################
+# Search Agent #
+################
+
+class SearchAgent(agent.Agent):
+    """Agent that plays the move found by a Searcher"""
+
+    # Class constructor.
+    #
+    # PARAM [string]   name:       the name of this player
+    # PARAM [function] evaluate:   the evaluation function, see Searcher
+    # PARAM [float]    time_limit: the time budget of a move, in seconds
+    # PARAM [int]      max_depth:  the maximum search depth, or None for no limit
+    # PARAM [float]    tt_megabytes: the size of the transposition table, or None for none
+    # PARAM [bool]     pvs:        if True, use principal variation search
+    # PARAM [number]   aspiration: the aspiration window half-width, or None for full windows
+    # PARAM [solver.Solver] solver: optional endgame solver, see Searcher
+    # PARAM [book.OpeningBook] book: optional opening book, consulted before searching
+    def __init__(self, name, evaluate, time_limit, max_depth=None, tt_megabytes=16,
+                 pvs=True, aspiration=None, solver=None, book=None):
+        super().__init__(name)
+        # Opening book
+        self.book = book
+        tt = None
+        if tt_megabytes is not None:
+            tt = transposition.TranspositionTable(tt_megabytes)
+        # The search engine
+        self.searcher = Searcher(evaluate, time_limit, max_depth, tt=tt,
+                                 orderer=ordering.MoveOrderer(), pvs=pvs, aspiration=aspiration,
+                                 solver=solver)
+        # Statistics of the last move
+        self.stats = self.searcher.stats
+
+    # Pick a column.
+    #
+    # PARAM [board.Board] brd: the current board state
+    # RETURN [int]: the column where the token must be added
+    @stats.measured
+    def go(self, brd):
+        """Search for the best move (choice of column for the token)"""
+        if self.book is not None:
+            move = self.book.lookup(brd)
+            if move != -1:
+                return move
+        return self.searcher.search(brd)
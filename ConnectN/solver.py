@@ -0,0 +1,274 @@
+import time
+
+import ordering
+import search
+import transposition
+from transposition import EXACT, LOWER, UPPER
+
+# Widest bit layout the solver takes, w*(h+1)
+MAX_BITS = 64
+
+##################
+# Endgame Solver #
+##################
+
+# Exact win/draw/loss search on bitboards.
+#
+# The position is kept as two integers laid out like bitboard.BitBoard: the
+# cells of the player to move, and the occupied cells, with cell (x,y) at bit
+# x*(h+1)+y and a sentinel row on top of each column. Results are stored in a
+# transposition table under the key of the position or of its mirror image,
+# whichever is smaller, and symmetric positions only search half the columns.
+# A key is the whole position, so it must fit in the table's 64-bit keys:
+# boards with more than 64 bits, sentinel row included, are not solved.
+class Solver(object):
+    """Exact win/draw/loss search for endgames and small boards"""
+
+    # Class constructor.
+    #
+    # PARAM [int]   threshold:    solve positions with at most this many empty cells
+    # PARAM [int]   small_board:  solve boards of at most this many cells from any position
+    # PARAM [float] tt_megabytes: the size of the transposition table
+    def __init__(self, threshold=12, small_board=16, tt_megabytes=16):
+        """Class constructor"""
+        # Empty cell threshold
+        self.threshold = threshold
+        # Largest board solved from the start
+        self.small_board = small_board
+        # Transposition table, kept from one solve to the next
+        self.tt = transposition.TranspositionTable(tt_megabytes)
+        # Geometry the table and the masks below are for
+        self.geometry = None
+        # Deadline of the current solve, or None
+        self.deadline = None
+        # Nodes visited in the current solve
+        self.nodes = 0
+
+    # Check whether a board is for the solver.
+    #
+    # PARAM [board.Board] brd: the board state
+    # RETURN [Bool]: True if the board is small or has few empty cells left,
+    #                and its positions fit in MAX_BITS bits
+    def applies(self, brd):
+        """Returns True if brd should be solved exactly"""
+        if brd.w * (brd.h + 1) > MAX_BITS:
+            return False
+        cells = brd.w * brd.h
+        return cells <= self.small_board or cells - sum(brd.heights) <= self.threshold
+
+    # Set up the masks of a board geometry.
+    #
+    # PARAM [int] w: the board width
+    # PARAM [int] h: the board height
+    # PARAM [int] n: the number of tokens to line up to win
+    #
+    # NOTE: ValueError is raised if w*(h+1) is more than MAX_BITS.
+    def setup(self, w, h, n):
+        """Prepares the bit masks for the given geometry"""
+        if self.geometry == (w, h, n):
+            return
+        if w * (h + 1) > MAX_BITS:
+            raise ValueError("a {}x{} board does not fit in {} bits".format(w, h, MAX_BITS))
+        self.geometry = (w, h, n)
+        self.w = w
+        self.h = h
+        self.n = n
+        hh = h + 1
+        # Bottom cell of each column, and every cell of the board
+        self.bottom = sum(1 << (x * hh) for x in range(w))
+        self.board_mask = self.bottom * ((1 << h) - 1)
+        # Cells of one column
+        self.column = (1 << h) - 1
+        # Shifts of the four directions: vertical, horizontal, both diagonals
+        self.shifts = (1, hh, h, h + 2)
+        # Columns, center first
+        self.order = ordering.center_order(w)
+        self.tt.clear()
+
+    # Solve a board.
+    #
+    # PARAM [board.Board] brd:      the board state; it is not modified
+    # PARAM [float]       deadline (optional): the time to give up at
+    # RETURN [int, int]: 1, 0 or -1 if the player to move wins, draws or
+    #                    loses with best play, and a move that achieves it
+    #
+    # NOTE: search.SearchTimeout is raised if the deadline passes.
+    def solve(self, brd, deadline=None):
+        """Returns (value, move) of brd for the player to move, from an exact search"""
+        self.setup(brd.w, brd.h, brd.n)
+        self.deadline = deadline
+        self.nodes = 0
+        hh = self.h + 1
+        rows = brd.board
+        cur = 0
+        mask = 0
+        for x in range(self.w):
+            for y in range(brd.heights[x]):
+                bit = 1 << (x * hh + y)
+                mask |= bit
+                if rows[y][x] == brd.player:
+                    cur |= bit
+        moves_left = self.w * self.h - sum(brd.heights)
+        best_value = -2
+        best = -1
+        for x in self.moves(cur, mask):
+            move = (mask + (1 << (x * hh))) & ~mask
+            if self.winning_cells(cur) & move:
+                return 1, x
+            value = -self.negamax(cur ^ mask, mask | move, -1, -best_value, moves_left - 1)
+            if value > best_value:
+                best_value = value
+                best = x
+                if value == 1:
+                    break
+        return best_value, best
+
+    # Evaluate a position with negamax over win/draw/loss.
+    #
+    # PARAM [int] cur:        the cells of the player to move
+    # PARAM [int] mask:       the occupied cells
+    # PARAM [int] alpha:      the lower bound of the search window
+    # PARAM [int] beta:       the upper bound of the search window
+    # PARAM [int] moves_left: the number of empty cells
+    # RETURN [int]: 1, 0 or -1 for a win, draw or loss of the player to move
+    #
+    # NOTE: The opponent's last move is assumed not to have won.
+    def negamax(self, cur, mask, alpha, beta, moves_left):
+        """Returns the exact value of the position for the player to move"""
+        self.nodes += 1
+        if self.deadline is not None and self.nodes & 1023 == 0 and time.time() > self.deadline:
+            raise search.SearchTimeout()
+        if moves_left == 0:
+            return 0
+        possible = (mask + self.bottom) & self.board_mask
+        if self.winning_cells(cur) & possible:
+            return 1
+        if moves_left == 1:
+            return 0
+        opp_wins = self.winning_cells(cur ^ mask)
+        forced = opp_wins & possible
+        if forced:
+            # Two threats can't both be blocked
+            if forced & (forced - 1):
+                return -1
+            possible = forced
+        # Never play right under an opponent's winning cell
+        possible &= ~(opp_wins >> 1)
+        if not possible:
+            return -1
+        # Both remaining moves can at best draw
+        if moves_left == 2:
+            return 0
+        key, flipped, symmetric = self.key(cur, mask)
+        tt_move = -1
+        entry = self.tt.probe(key)
+        if entry is not None:
+            (depth, bound, value, tt_move) = entry
+            value = int(value)
+            if flipped and tt_move != -1:
+                tt_move = self.w - 1 - tt_move
+            if bound == EXACT:
+                return value
+            if bound == LOWER and value > alpha:
+                alpha = value
+            elif bound == UPPER and value < beta:
+                beta = value
+            if alpha >= beta:
+                return value
+        alpha_orig = alpha
+        hh = self.h + 1
+        best = -2
+        best_move = -1
+        for x in self.moves(cur, mask, tt_move, symmetric):
+            move = possible & (self.column << (x * hh))
+            if not move:
+                continue
+            value = -self.negamax(cur ^ mask, mask | move, -beta, -alpha, moves_left - 1)
+            if value > best:
+                best = value
+                best_move = x
+                if value > alpha:
+                    alpha = value
+                    if alpha >= beta:
+                        break
+        if flipped:
+            best_move = self.w - 1 - best_move
+        if best <= alpha_orig:
+            bound = UPPER
+        elif best >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.tt.store(key, moves_left, bound, best, best_move)
+        return best
+
+    # Find the empty cells that would complete a line.
+    #
+    # PARAM [int] bits: the cells of one player
+    # RETURN [int]: the cells of the board, empty or not, where a token of
+    #               that player would line up n tokens
+    def winning_cells(self, bits):
+        """Returns the cells where a token would complete a line of n for the given player"""
+        n = self.n
+        cells = 0
+        for s in self.shifts:
+            # runs[i] has bit b set if cell b+i*s is taken; a window starting
+            # at b misses only cell k if every other runs[i] has bit b
+            runs = [bits >> (i * s) for i in range(n)]
+            prefix = [-1] * (n + 1)
+            for i in range(n):
+                prefix[i+1] = prefix[i] & runs[i]
+            suffix = -1
+            for k in range(n - 1, -1, -1):
+                cells |= (prefix[k] & suffix) << (k * s)
+                suffix &= runs[k]
+        return cells & self.board_mask
+
+    # Get the transposition table key of a position.
+    #
+    # PARAM [int] cur:  the cells of the player to move
+    # PARAM [int] mask: the occupied cells
+    # RETURN [int, Bool, Bool]: the smaller of the keys of the position and its
+    #                           mirror image, whether that is the mirror image's,
+    #                           and whether the two are the same
+    def key(self, cur, mask):
+        """Returns the canonical key of the position, whether it is mirrored, and whether it is symmetric"""
+        key = cur + mask
+        mirror = self.mirror(cur) + self.mirror(mask)
+        flipped = mirror < key
+        if flipped:
+            (key, mirror) = (mirror, key)
+        return key, flipped, key == mirror
+
+    # Mirror a bitboard left to right.
+    #
+    # PARAM [int] bits: the bitboard
+    # RETURN [int]: the bitboard with column x moved to column w-1-x
+    def mirror(self, bits):
+        """Returns the left-right mirror image of bits"""
+        hh = self.h + 1
+        col = self.column
+        w = self.w
+        out = 0
+        for x in range(w):
+            out |= ((bits >> (x * hh)) & col) << ((w - 1 - x) * hh)
+        return out
+
+    # List the columns to try.
+    #
+    # PARAM [int]  cur:       the cells of the player to move
+    # PARAM [int]  mask:      the occupied cells
+    # PARAM [int]  tt_move (optional):   the stored best move, tried first
+    # PARAM [Bool] symmetric (optional): if True, only the left half is tried
+    # RETURN [list of int]: the free columns, center first
+    def moves(self, cur, mask, tt_move=-1, symmetric=False):
+        """Returns the free columns in search order"""
+        hh = self.h + 1
+        top = 1 << (self.h - 1)
+        w = self.w
+        moves = [x for x in self.order
+                 if not mask & (top << (x * hh)) and not (symmetric and 2 * x > w - 1)]
+        if tt_move in moves:
+            moves.remove(tt_move)
+            moves.insert(0, tt_move)
+        return moves
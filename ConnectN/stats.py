@@ -0,0 +1,95 @@
+import functools
+import time
+
+#####################
+# Search Statistics #
+#####################
+
+class SearchStats(object):
+    """Counters describing the search behind one move"""
+
+    __slots__ = ('nodes', 'evals', 'cutoffs', 'cutoff_index', 'tt_probes', 'tt_hits',
+                 'depth', 'started', 'elapsed')
+
+    # Class constructor.
+    def __init__(self):
+        """Class constructor"""
+        self.start()
+
+    # Reset the counters and start the clock.
+    def start(self):
+        """Zeroes the counters and starts timing a new search"""
+        # Positions visited
+        self.nodes = 0
+        # Positions scored by the evaluation function
+        self.evals = 0
+        # Beta cutoffs, and how many happened at each move index (0 = first move tried)
+        self.cutoffs = 0
+        self.cutoff_index = []
+        # Transposition table lookups, and those that found the position
+        self.tt_probes = 0
+        self.tt_hits = 0
+        # Depth of the deepest completed search
+        self.depth = 0
+        # Start time and duration of the search, in seconds
+        self.started = time.time()
+        self.elapsed = 0.0
+
+    # Stop the clock.
+    def stop(self):
+        """Records the time spent since start()"""
+        self.elapsed = time.time() - self.started
+
+    # Record a beta cutoff.
+    #
+    # PARAM [int] index: the position of the move that caused it in the search order
+    def cutoff(self, index):
+        """Counts a beta cutoff caused by the index-th move tried"""
+        self.cutoffs += 1
+        counts = self.cutoff_index
+        while len(counts) <= index:
+            counts.append(0)
+        counts[index] += 1
+
+    # Effective branching factor: the b for which a uniform tree of the
+    # completed depth would have as many nodes as were visited.
+    #
+    # RETURN [float]: the effective branching factor, or 0 before any search
+    def branching_factor(self):
+        """Returns nodes ** (1 / depth)"""
+        if self.depth <= 0 or self.nodes <= 0:
+            return 0.0
+        return self.nodes ** (1.0 / self.depth)
+
+    # Export the counters.
+    #
+    # RETURN [dict]: the counters, the elapsed time and the branching factor
+    def as_dict(self):
+        """Returns the statistics as a JSON-friendly dictionary"""
+        return {
+            "nodes": self.nodes,
+            "evals": self.evals,
+            "cutoffs": self.cutoffs,
+            "cutoff_index": self.cutoff_index[:],
+            "tt_probes": self.tt_probes,
+            "tt_hits": self.tt_hits,
+            "depth": self.depth,
+            "elapsed": self.elapsed,
+            "branching_factor": self.branching_factor(),
+        }
+
+# Decorator for an agent's go() method: restarts the agent's statistics
+# before each move and stops their clock after it.
+#
+# PARAM [function] go: the go(self, brd) method of an agent with a stats attribute
+# RETURN [function]: the wrapped method
+def measured(go):
+    """Wraps go() to time each move in self.stats"""
+    @functools.wraps(go)
+    def wrapper(self, brd):
+        self.stats.start()
+        try:
+            return go(self, brd)
+        finally:
+            self.stats.stop()
+    return wrapper
@@ -0,0 +1,115 @@
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bitboard
+import board
+from GamarraNikolas import heuristic as heuristic1
+from GamarraNikolas2 import heuristic as heuristic2
+from GamarraNikolas3 import heuristic as heuristic3
+
+#####################################
+# Ray tables vs stepping walk_line  #
+#####################################
+
+# The eight step directions of walk_line
+DIRECTIONS = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1) if (dx, dy) != (0, 0)]
+
+# Walk a line one step at a time, as walk_line did before the ray tables.
+#
+# PARAM [Heuristic] node: the node whose board is walked
+# PARAM [int]       x:    the x coordinate of the start cell
+# PARAM [int]       y:    the y coordinate of the start cell
+# PARAM [int]       dx:   the step in the x direction
+# PARAM [int]       dy:   the step in the y direction
+# RETURN [int]: the number of cells after (x,y) holding the same token as (x,y)
+def stepping_walk_line(node, x, y, dx, dy):
+    """Reference walk_line that checks the bounds at every step"""
+    length = 0
+    rows = node.board.board
+    char = rows[y][x]
+    x += dx
+    y += dy
+    while node.is_bounded(x, y):
+        if rows[y][x] != char:
+            break
+        length += 1
+        x += dx
+        y += dy
+    return length
+
+# Reference version of each Heuristic, scoring with the stepping walk_line
+REFERENCES = []
+for module in (heuristic1, heuristic2, heuristic3):
+    REFERENCES.append((module.Heuristic,
+                       type("Stepping" + module.__name__.split(".")[0], (module.Heuristic,),
+                            {"__slots__": (), "walk_line": stepping_walk_line})))
+
+# Generate random positions.
+#
+# PARAM [class] board_type: board.Board or bitboard.BitBoard
+# PARAM [int]   count:      the number of games to play
+# PARAM [int]   seed:       the random seed
+# RETURN [generator of board.Board]: the board after each random move; it is
+#                                    the same object for a whole game
+def random_positions(board_type, count, seed):
+    """Yields the positions of random games of random geometries"""
+    rng = random.Random(seed)
+    for g in range(count):
+        w, h, n = rng.randint(4, 9), rng.randint(4, 8), rng.randint(3, 5)
+        brd = board_type([[0] * w for y in range(h)], w, h, n)
+        while brd.free_cols():
+            brd.add_token(rng.choice(brd.free_cols()))
+            yield brd
+
+class TestRayTable(unittest.TestCase):
+    """ray_table() lists the cells a stepping walk visits"""
+
+    def test_rays_match_steps(self):
+        for w in range(1, 8):
+            for h in range(1, 7):
+                for (dx, dy) in DIRECTIONS:
+                    table = board.ray_table(w, h, dx, dy)
+                    for y in range(h):
+                        for x in range(w):
+                            cells = []
+                            (i, j) = (x + dx, y + dy)
+                            while 0 <= i < w and 0 <= j < h:
+                                cells.append((i, j))
+                                (i, j) = (i + dx, j + dy)
+                            self.assertEqual(list(table[y][x]), cells)
+
+class TestHeuristicRays(unittest.TestCase):
+    """The ray-table Heuristic scores like the stepping one"""
+
+    def check_scores(self, board_type, seed):
+        for brd in random_positions(board_type, 60, seed):
+            col = brd.last_move[0]
+            for (heuristic, reference) in REFERENCES:
+                for root in (1, 2):
+                    self.assertEqual(heuristic((brd, col), root, 0.5).score,
+                                     reference((brd, col), root, 0.5).score)
+                    # Root nodes are scored for column -1, off the board
+                    self.assertEqual(heuristic((brd, -1), root).score,
+                                     reference((brd, -1), root).score)
+
+    def test_board(self):
+        self.check_scores(board.Board, 1)
+
+    def test_bitboard(self):
+        self.check_scores(bitboard.BitBoard, 2)
+
+    def test_walk_line(self):
+        for brd in random_positions(board.Board, 30, 3):
+            node = heuristic1.Heuristic((brd, brd.last_move[0]), 1)
+            for y in range(brd.h):
+                for x in range(brd.w):
+                    for (dx, dy) in DIRECTIONS:
+                        self.assertEqual(node.walk_line(x, y, dx, dy),
+                                         stepping_walk_line(node, x, y, dx, dy))
+
+if __name__ == "__main__":
+    unittest.main()
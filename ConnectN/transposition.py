@@ -0,0 +1,98 @@
+import array
+import struct
+
+########################
+# Transposition Table  #
+########################
+
+# Bound types of a stored score
+EXACT = 0  # the score is exact
+LOWER = 1  # the score is a lower bound (the search failed high)
+UPPER = 2  # the score is an upper bound (the search failed low)
+
+# 64-bit words per entry: check word, packed depth/bound/move, score
+_WORDS = 3
+# Marks a used entry in the packed word
+_USED = 1 << 63
+
+# Converts a score to and from the bits of a double
+_DOUBLE = struct.Struct("<d")
+_WORD = struct.Struct("<Q")
+
+class TranspositionTable(object):
+    """Fixed-capacity table of search results, keyed by position hash"""
+
+    # Class constructor.
+    #
+    # PARAM [float]  megabytes: the memory cap of the table
+    # PARAM [buffer] buffer:    optional memory to hold the table, for example
+    #                           a shared memory block; it must be zeroed and
+    #                           its size sets the capacity (megabytes is ignored)
+    #
+    # NOTE: Entries go in buckets of two: the first slot keeps the deepest
+    #       result (depth-preferred), the second takes everything else
+    #       (always-replace).
+    def __init__(self, megabytes=16, buffer=None):
+        """Class constructor"""
+        if buffer is None:
+            entries = int(megabytes * 1024 * 1024) // (8 * _WORDS)
+            self.table = array.array('Q', bytes(8 * _WORDS * entries))
+        else:
+            view = memoryview(buffer).cast('B')
+            entries = len(view) // (8 * _WORDS)
+            self.table = view[:8 * _WORDS * entries].cast('Q')
+        # Number of two-entry buckets
+        self.buckets = max(1, entries // 2)
+
+    # Size in bytes of a table holding the given number of entries.
+    #
+    # PARAM [int] entries: the number of entries
+    # RETURN [int]: the number of bytes needed
+    @staticmethod
+    def bytes_for(entries):
+        """Returns the buffer size needed for the given number of entries"""
+        return 8 * _WORDS * entries
+
+    # Look up a position.
+    #
+    # PARAM [int] key: the 64-bit position key
+    # RETURN [(int, int, number, int)]: the stored (depth, bound, score, move),
+    #                                   or None if the position is not stored
+    def probe(self, key):
+        """Returns (depth, bound, score, move) stored for key, or None"""
+        t = self.table
+        i = (key % self.buckets) * 2 * _WORDS
+        for j in (i, i + _WORDS):
+            data = t[j+1]
+            # The check word is the key mixed with the data, so an entry torn
+            # by a concurrent writer does not match
+            if data & _USED and t[j] ^ data ^ t[j+2] == key:
+                score = _DOUBLE.unpack(_WORD.pack(t[j+2]))[0]
+                return (data & 0xffff, (data >> 16) & 3, score, ((data >> 18) & 0xffff) - 1)
+        return None
+
+    # Store a search result.
+    #
+    # PARAM [int]    key:   the 64-bit position key
+    # PARAM [int]    depth: the depth of the search
+    # PARAM [int]    bound: EXACT, LOWER or UPPER
+    # PARAM [number] score: the score of the position
+    # PARAM [int]    move:  the best move, or -1 if none
+    def store(self, key, depth, bound, score, move):
+        """Stores a search result for key"""
+        t = self.table
+        j = (key % self.buckets) * 2 * _WORDS
+        # Keep the deeper result in the first slot, unless it's the same position
+        first = t[j+1]
+        if first & _USED and t[j] ^ first ^ t[j+2] != key and (first & 0xffff) > depth:
+            j += _WORDS
+        data = _USED | ((move + 1) << 18) | (bound << 16) | depth
+        bits = _WORD.unpack(_DOUBLE.pack(score))[0]
+        t[j] = key ^ data ^ bits
+        t[j+1] = data
+        t[j+2] = bits
+
+    # Remove every entry.
+    def clear(self):
+        """Empties the table"""
+        self.table[:] = array.array('Q', bytes(8 * len(self.table)))